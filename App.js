@@ -1,8 +1,12 @@
+// localStorage key of the delta-synced catalog copy
+const CATALOG_CACHE_KEY = 'luanda-catalog';
+
 class App {
     constructor() {
         this.mapManager = new MapManager('map', (inst) => this.showInfoCard(inst));
         this.institutionList = document.getElementById('institutionList');
         this.searchInput = document.getElementById('searchInput');
+        this.searchSuggestions = document.getElementById('searchSuggestions');
 
         // Info Card Elements
         this.infoOverlay = document.getElementById('infoOverlay');
@@ -20,6 +24,7 @@ class App {
         this.adminBadge = document.getElementById('adminBadge');
         this.adminModal = document.getElementById('adminModal');
         this.closeAdminBtn = document.getElementById('closeAdminBtn');
+        this.statsStream = null;
 
         this.loadData();
         this.checkAdmin(); // Check if current user is admin
@@ -45,7 +50,7 @@ class App {
                 const newClose = this.closeAdminBtn.cloneNode(true);
                 this.closeAdminBtn.parentNode.replaceChild(newClose, this.closeAdminBtn);
                 this.closeAdminBtn = newClose;
-                this.closeAdminBtn.addEventListener('click', () => this.adminModal.classList.add('hidden'));
+                this.closeAdminBtn.addEventListener('click', () => this.closeStats());
             } else {
                 console.log("User is not admin. Hiding badge.");
                 this.adminBadge.classList.add('force-hidden');
@@ -56,51 +61,117 @@ class App {
         }
     }
 
-    async loadStats() {
-        try {
-            const response = await fetch('/api/admin/stats');
-            const data = await response.json();
+    loadStats() {
+        // Live dashboard: one snapshot, then the server pushes deltas while the modal is open
+        this.closeStats();
+        this.statsStream = new EventSource('/api/admin/stream');
+        this.statsStream.addEventListener('snapshot', (e) => this.renderStats(JSON.parse(e.data)));
+        this.statsStream.addEventListener('counters', (e) => {
+            const delta = JSON.parse(e.data);
+            this.bumpStat('totalVisits', delta.visits);
+            this.bumpStat('totalUsers', delta.users);
+            this.bumpStat('totalInstitutions', delta.institutions);
+        });
+        this.statsStream.addEventListener('login', (e) => {
+            const tbody = document.getElementById('logTableBody');
+            tbody.prepend(this.logRow(JSON.parse(e.data)));
+            while (tbody.rows.length > 10) tbody.deleteRow(-1);
+        });
+        this.statsStream.onerror = (e) => console.error("Admin stream interrupted, retrying", e);
+        this.adminModal.classList.remove('hidden');
+    }
 
-            document.getElementById('totalVisits').textContent = data.total_visits;
-            document.getElementById('totalUsers').textContent = data.total_users;
-            document.getElementById('totalInstitutions').textContent = data.total_institutions;
+    closeStats() {
+        if (this.statsStream) {
+            this.statsStream.close();
+            this.statsStream = null;
+        }
+        this.adminModal.classList.add('hidden');
+    }
 
-            const tbody = document.getElementById('logTableBody');
-            tbody.innerHTML = '';
+    renderStats(data) {
+        document.getElementById('totalVisits').textContent = data.total_visits;
+        document.getElementById('totalUsers').textContent = data.total_users;
+        document.getElementById('totalInstitutions').textContent = data.total_institutions;
 
-            data.recent_logs.forEach(log => {
-                const row = document.createElement('tr');
-                row.innerHTML = `<td>${new Date(log.timestamp).toLocaleString()}</td><td>${log.username}</td><td>${log.ip}</td>`;
-                tbody.appendChild(row);
-            });
+        const tbody = document.getElementById('logTableBody');
+        tbody.innerHTML = '';
+        data.recent_logs.forEach(log => tbody.appendChild(this.logRow(log)));
+    }
 
-            this.adminModal.classList.remove('hidden');
-        } catch (e) { console.error(e); }
+    bumpStat(id, delta) {
+        if (!delta) return;
+        const el = document.getElementById(id);
+        el.textContent = (parseInt(el.textContent, 10) || 0) + delta;
+    }
+
+    logRow(log) {
+        const row = document.createElement('tr');
+        row.innerHTML = `<td>${new Date(log.timestamp).toLocaleString()}</td><td>${log.username}</td><td>${log.ip}</td>`;
+        return row;
     }
 
     async loadData() {
+        // Keep a local copy of the catalog and fetch only what changed since the last visit
+        const cached = this.readCatalogCache();
+        const byId = new Map(cached.items.map(inst => [inst.id, inst]));
+        let version = cached.version;
         try {
-            const response = await fetch('/api/institutions');
-            if (response.status === 401) {
-                window.location.href = '/';
-                return;
+            while (true) {
+                const response = await fetch(`/api/institutions/changes?since=${encodeURIComponent(version)}`, { cache: "no-store" });
+                if (response.status === 401) {
+                    window.location.href = '/';
+                    return;
+                }
+                const page = await response.json();
+                if (page.reset) {
+                    // Server no longer knows our version: start over
+                    byId.clear();
+                    version = 0;
+                    continue;
+                }
+                page.changes.forEach(inst => byId.set(inst.id, inst));
+                page.deleted.forEach(id => byId.delete(id));
+                version = page.version;
+                if (!page.has_more) break;
             }
-            this.institutions = await response.json();
-            this.renderList(this.institutions);
-            this.mapManager.addMarkers(this.institutions);
+            this.institutions = [...byId.values()].sort((a, b) => a.id - b.id);
+            this.writeCatalogCache(version, this.institutions);
         } catch (err) {
-            console.error("Failed to load institutions", err);
+            // Offline or flaky link: fall back to the last synced copy
+            console.error("Failed to sync institutions", err);
+            this.institutions = cached.items;
+        }
+        this.renderList(this.institutions);
+    }
+
+    readCatalogCache() {
+        try {
+            const stored = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY));
+            if (stored && Array.isArray(stored.items)) return stored;
+        } catch (e) { /* corrupt or unavailable storage */ }
+        return { version: 0, items: [] };
+    }
+
+    writeCatalogCache(version, items) {
+        try {
+            localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify({ version, items }));
+        } catch (e) {
+            console.warn("Could not store the catalog locally", e);
         }
     }
 
     bindEvents() {
+        // Server-side full-text search, debounced so fast typing sends one request
         this.searchInput.addEventListener('input', (e) => {
-            const term = e.target.value.toLowerCase();
-            const filtered = this.institutions.filter(inst =>
-                inst.name.toLowerCase().includes(term) ||
-                inst.type.toLowerCase().includes(term)
-            );
-            this.renderList(filtered);
+            clearTimeout(this.searchTimer);
+            const term = e.target.value.trim();
+            if (!term) {
+                this.renderList(this.institutions);
+                return;
+            }
+            this.suggest(term);
+            this.searchTimer = setTimeout(() => this.search(term), 150);
         });
 
         this.closeInfoBtn.addEventListener('click', () => {
@@ -117,11 +188,43 @@ class App {
         // Admin modal outside click
         this.adminModal.addEventListener('click', (e) => {
             if (e.target === this.adminModal) {
-                this.adminModal.classList.add('hidden');
+                this.closeStats();
             }
         });
     }
 
+    async search(term) {
+        try {
+            const response = await fetch(`/api/search?q=${encodeURIComponent(term)}`);
+            if (!response.ok) return;
+            const results = await response.json();
+            // Ignore responses that arrive after the input has changed again
+            if (this.searchInput.value.trim() === term) {
+                this.renderList(results);
+            }
+        } catch (err) {
+            console.error("Search failed", err);
+        }
+    }
+
+    async suggest(term) {
+        // Prefix suggestions are cheap enough to ask for on every keystroke
+        try {
+            const response = await fetch(`/api/autocomplete?q=${encodeURIComponent(term)}`);
+            if (!response.ok || this.searchInput.value.trim() !== term) return;
+            const suggestions = await response.json();
+            this.searchSuggestions.innerHTML = '';
+            suggestions.forEach(s => {
+                const option = document.createElement('option');
+                option.value = s.text;
+                if (s.kind === 'locality') option.label = 'Localidade';
+                this.searchSuggestions.appendChild(option);
+            });
+        } catch (err) {
+            console.error("Autocomplete failed", err);
+        }
+    }
+
     showInfoCard(inst) {
         this.infoTitle.textContent = inst.name;
         this.infoType.textContent = inst.type;
@@ -143,11 +246,12 @@ class App {
             const li = document.createElement('li');
             li.className = 'institution-item';
             li.innerHTML = `
-                <h3>${inst.name}</h3>
+                <h3>${inst.name_highlight || inst.name}</h3>
                 <p>${inst.type}</p>
+                ${inst.snippet ? `<p class="search-snippet">${inst.snippet}</p>` : ''}
             `;
             li.addEventListener('click', () => {
-                this.mapManager.focusMarker(inst.id);
+                this.mapManager.focusMarker(inst);
             });
             this.institutionList.appendChild(li);
         });
@@ -1,7 +1,9 @@
 class MapManager {
     constructor(mapId, onMarkerClick) {
         this.map = null;
+        this.layer = null;
         this.markers = [];
+        this.requestId = 0;
         this.onMarkerClick = onMarkerClick; // Callback for click handling
         this.initMap(mapId);
     }
@@ -22,41 +24,102 @@ class MapManager {
             subdomains: 'abcd',
             maxZoom: 20
         }).addTo(this.map);
+
+        // Only what is visible at the current zoom is fetched and drawn
+        this.layer = L.layerGroup().addTo(this.map);
+        this.map.on('moveend', () => this.loadVisible());
+        this.loadVisible();
+    }
+
+    async loadVisible() {
+        const requestId = ++this.requestId;
+        const zoom = Math.round(this.map.getZoom());
+        const bbox = this.visibleBBox();
+
+        try {
+            const response = await fetch(`/api/institutions/clusters?zoom=${zoom}&bbox=${bbox}`);
+            if (!response.ok) return;
+            const items = await response.json();
+            // Drop responses superseded by a newer pan/zoom
+            if (requestId === this.requestId) {
+                this.addMarkers(items);
+            }
+        } catch (err) {
+            console.error("Failed to load map markers", err);
+        }
     }
 
-    addMarkers(institutions) {
+    visibleBBox() {
+        // The padded view overshoots the world at low zoom; the API only takes real coordinates
+        const bounds = this.map.getBounds().pad(0.2);
+        const clamp = (value, limit) => Math.max(-limit, Math.min(limit, value));
+        const south = clamp(bounds.getSouth(), 90);
+        const north = clamp(bounds.getNorth(), 90);
+        let west = clamp(bounds.getWest(), 180);
+        let east = clamp(bounds.getEast(), 180);
+        if (bounds.getEast() - bounds.getWest() >= 360) {
+            west = -180;
+            east = 180;
+        }
+        return [west, south, east, north].join(',');
+    }
+
+    addMarkers(items) {
         // Clear existing
-        this.markers.forEach(m => this.map.removeLayer(m));
+        this.layer.clearLayers();
         this.markers = [];
 
-        institutions.forEach(inst => {
-            const marker = L.marker([inst.latitude, inst.longitude]);
-
-            // Add White Label (Tooltip)
-            marker.bindTooltip(inst.name, {
-                permanent: true,
-                direction: 'bottom',
-                className: 'map-label', // This class is styled in CSS to be white
-                offset: [0, 10]
-            });
-
-            // Handle Click -> Show Info Card
-            marker.on('click', () => {
-                this.map.setView(marker.getLatLng(), 15);
-                if (this.onMarkerClick) this.onMarkerClick(inst);
-            });
-
-            marker.addTo(this.map);
-            this.markers.push({ id: inst.id, marker });
+        items.forEach(item => {
+            if (item.kind === 'cluster') {
+                this.addCluster(item);
+            } else {
+                this.addInstitution(item);
+            }
         });
     }
 
-    focusMarker(id) {
-        const target = this.markers.find(m => m.id === id);
-        if (target) {
-            this.map.setView(target.marker.getLatLng(), 16);
-            // Trigger the click logic visually to show info
-            target.marker.fire('click');
-        }
+    addCluster(cluster) {
+        const size = cluster.count < 10 ? 'small' : cluster.count < 100 ? 'medium' : 'large';
+        const marker = L.marker([cluster.latitude, cluster.longitude], {
+            icon: L.divIcon({
+                html: `<span>${cluster.count}</span>`,
+                className: `cluster-marker cluster-${size}`,
+                iconSize: [40, 40]
+            })
+        });
+
+        // Zoom in until the cluster splits
+        marker.on('click', () => {
+            this.map.setView(marker.getLatLng(), cluster.expansion_zoom);
+        });
+
+        marker.addTo(this.layer);
+    }
+
+    addInstitution(inst) {
+        const marker = L.marker([inst.latitude, inst.longitude]);
+
+        // Add White Label (Tooltip)
+        marker.bindTooltip(inst.name, {
+            permanent: true,
+            direction: 'bottom',
+            className: 'map-label', // This class is styled in CSS to be white
+            offset: [0, 10]
+        });
+
+        // Handle Click -> Show Info Card
+        marker.on('click', () => {
+            this.map.setView(marker.getLatLng(), 15);
+            if (this.onMarkerClick) this.onMarkerClick(inst);
+        });
+
+        marker.addTo(this.layer);
+        this.markers.push({ id: inst.id, marker });
+    }
+
+    focusMarker(inst) {
+        // The marker may not be loaded yet (clustered or off-screen), so go by coordinates
+        this.map.setView([inst.latitude, inst.longitude], 16);
+        if (this.onMarkerClick) this.onMarkerClick(inst);
     }
 }
@@ -1,14 +1,187 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from src.database import Database
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, g, send_from_directory, abort
+from src.sharding import ShardedDatabase
 from src.models.user import User
 from src.models.institution import Institution
+from src.geo import parse_bbox, valid_coordinates
+from src.catalog_cache import catalog_cache
+from src.log_writer import LoginLogWriter
+from src.stats import Stats
+from src.importer import InstitutionImporter, ImportFailed, detect_format
+from src.clusters import ClusterIndex
+from src.tiles import TileCache
+from src.courses import CourseCatalog
+from src.autocomplete import AutocompleteIndex
+from src.snapshot import SnapshotStore
+from src.retention import LoginLogRetention
+from src.metrics import metrics
+from src.profiler import SamplingProfiler
+from src.passwords import password_hasher
+from src.events import event_bus, format_sse
+from src.assets import AssetManifest, BUNDLES, IMMUTABLE_CACHE_CONTROL
+import datetime
+import hmac
+import io
+import json
+import mimetypes
 import os
+import threading
 
 app = Flask(__name__)
 app.secret_key = 'super_secret_key_for_luanda_locator' # Replace with env var in prod
 
-# Initialize Database
-db = Database()
+# Upper bounds for spatial query results
+MAX_NEAREST = 100
+MAX_BBOX_RESULTS = 5000
+MAX_SEARCH_RESULTS = 100
+MAX_PAGE_SIZE = 1000
+NDJSON_PAGE_SIZE = 500  # rows per database read while streaming NDJSON
+MAX_DISTANCE_ORIGINS = 10000
+
+# Seconds between keep-alive comments on idle event streams (also how fast a gone client is noticed)
+ADMIN_STREAM_KEEPALIVE = 15
+
+# Seconds a shared admin snapshot is re-sent to streams that fell behind before it is recomputed
+ADMIN_SNAPSHOT_MAX_AGE = 1.0
+
+# Catalog responses are per-user (session) but always revalidated via ETag
+CATALOG_CACHE_CONTROL = 'private, no-cache'
+
+# Snapshot bodies are sent in slices of this many bytes (WSGI bodies must be bytes, not memoryviews)
+CATALOG_CHUNK_SIZE = 64 * 1024
+
+# Initialize Database (pooled connections, sized per worker); provinces listed in the
+# shard map live in their own files, without a map everything stays in one file
+db = ShardedDatabase(
+    os.environ.get('DATABASE_PATH', 'faculties.db'),
+    shard_map=os.environ.get('SHARD_MAP', 'shards.json'),
+    pool_size=int(os.environ.get('DB_POOL_SIZE', 8)),
+)
+
+# Login visits are written in batches off the request path
+login_log_writer = LoginLogWriter(
+    db,
+    flush_interval=float(os.environ.get('LOGIN_LOG_FLUSH_INTERVAL', 0.5)),
+    batch_size=int(os.environ.get('LOGIN_LOG_BATCH_SIZE', 500)),
+    max_queue=int(os.environ.get('LOGIN_LOG_MAX_QUEUE', 10000)),
+)
+
+# Memory-mapped catalog snapshot shared by all workers (CATALOG_SNAPSHOT='' disables it); created before the
+# indexes below so it hears of a catalog change before they do
+CATALOG_SNAPSHOT = os.environ.get('CATALOG_SNAPSHOT', 'catalog.snapshot')
+catalog_snapshot = SnapshotStore(db, CATALOG_SNAPSHOT) if CATALOG_SNAPSHOT else None
+
+# Zoom-aware marker clusters, updated incrementally on catalog changes
+cluster_index = ClusterIndex(db, source=lambda: catalog_reader())
+
+# Vector tiles of institution points (memory LRU + on-disk cache)
+tile_cache = TileCache(db, cache_dir=os.environ.get('TILE_CACHE_DIR', 'tile_cache'))
+
+# Normalized courses with an in-memory inverted index
+course_catalog = CourseCatalog(db, source=lambda: catalog_reader())
+
+# Accent-insensitive prefix index for the search box
+autocomplete_index = AutocompleteIndex(db)
+
+# Closed months of login_logs are partitioned, rolled up and eventually archived
+login_log_retention = LoginLogRetention(
+    db,
+    archive_dir=os.environ.get('LOGIN_LOG_ARCHIVE_DIR', 'archive'),
+    retention_days=int(os.environ.get('LOGIN_LOG_RETENTION_DAYS', 90)),
+)
+
+# /metrics takes this bearer token, or an admin session when none is configured; ?profile=1 (admins only) is opt-in
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+
+metrics.add_collector('db_connections_opened_total', 'counter', 'SQLite connections opened by the pool.',
+                      lambda: db.stats()['opened'])
+metrics.add_collector('db_pool_connections', 'gauge', 'Pooled SQLite connections by state.',
+                      lambda: {k: v for k, v in db.stats().items() if k in ('open', 'idle', 'in_use')}, label='state')
+metrics.add_collector('db_pool_waits_total', 'counter', 'Checkouts that waited for a free connection.',
+                      lambda: db.stats()['waits'])
+metrics.add_collector('login_log_events_total', 'counter', 'Login log events by outcome.',
+                      lambda: {k: v for k, v in login_log_writer.stats().items() if k in ('enqueued', 'written', 'dropped')}, label='outcome')
+metrics.add_collector('password_hash_pending', 'gauge', 'Password hashes queued or running.',
+                      lambda: password_hasher.stats()['pending'])
+metrics.add_collector('app_startup_seconds', 'gauge', 'Time to import app.py (database connections open lazily).',
+                      lambda: STARTUP_SECONDS)
+metrics.add_collector('db_migrate_seconds', 'gauge', 'Time spent checking/applying schema migrations at first connection.',
+                      lambda: db.startup['migrate_seconds'] or 0.0)
+metrics.add_collector('catalog_version', 'gauge', 'Catalog cache version (bumps on every change).',
+                      lambda: catalog_cache.version)
+metrics.add_collector('admin_stream_subscribers', 'gauge', 'Connected admin dashboard event streams.',
+                      lambda: event_bus.stats()['subscribers'])
+metrics.add_collector('admin_stream_events_dropped_total', 'counter', 'Events dropped from full subscriber buffers.',
+                      lambda: event_bus.stats()['dropped'])
+
+# --- Instrumentation ---
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get('profile') == '1' and _is_admin():
+        g.profiler = SamplingProfiler().start()
+
+@app.after_request
+def record_request(response):
+    """Records route latency; a profiled request returns its folded stacks instead."""
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        return Response(profiler.folded(), mimetype='text/plain')
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Exposes request, SQL and pool metrics in the Prometheus text format."""
+    if METRICS_TOKEN:
+        allowed = hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}')
+    else:
+        allowed = _is_admin()
+    if not allowed:
+        return jsonify({"error": "Unauthorized"}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+def admin_slow_queries():
+    """Returns the most recent statements slower than SLOW_QUERY_MS. Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(metrics.slow_queries())
+
+# --- Static assets ---
+
+# Content-hashed bundles from build_assets.py (read once at startup; rebuild, then restart)
+asset_manifest = AssetManifest(app.static_folder)
+
+@app.template_global()
+def asset_urls(name):
+    """URLs that load a bundle: its built file, or its source files when assets are not built."""
+    built = asset_manifest.file_for(name)
+    if built:
+        return [url_for('asset', filename=built)]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Serves a built asset, precompressed when the client accepts it, cached as immutable."""
+    if not asset_manifest.is_asset(filename):
+        abort(404)
+    path, encoding = asset_manifest.variant(filename, request.accept_encodings)
+    response = send_from_directory(asset_manifest.dist_folder, path, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
 
 # --- Routes ---
 
@@ -40,6 +213,7 @@ def register():
     
     # Create new user
     User(db, email=email, username=username, password=password).create()
+    event_bus.publish('counters', {"users": 1})
     return jsonify({"success": True, "message": "Conta criada com sucesso!"})
 
 @app.route('/api/login', methods=['POST'])
@@ -57,9 +231,8 @@ def login():
         session['username'] = found_user.username
         session['email'] = found_user.email
         
-        # Log the visit
-        ip = request.remote_addr
-        db.execute("INSERT INTO login_logs (user_id, ip_address) VALUES (?, ?)", (found_user.id, ip))
+        # Log the visit (queued; written, then published, in the next batch)
+        login_log_writer.log(found_user.id, request.remote_addr)
         
         # Check if admin (using email)
         is_admin = (found_user.email == 'admin@luanda.ao')
@@ -78,29 +251,139 @@ def forgot_password():
 def admin_stats():
     """Returns visit statistics. Only for admin."""
     # Check admin by email
-    if 'user_id' not in session or session.get('email') != 'admin@luanda.ao':
+    if not _is_admin():
         return jsonify({"error": "Unauthorized"}), 403
     
-    # Get total visits
-    total_visits = db.query("SELECT COUNT(*) as count FROM login_logs", one=True)['count']
-    
-    # Get total users
-    total_users = db.query("SELECT COUNT(*) as count FROM users", one=True)['count']
+    return jsonify(admin_snapshot())
 
-    # Get total institutions
-    total_institutions = db.query("SELECT COUNT(*) as count FROM institutions", one=True)['count']
-    
-    # Get recent logs
-    recent_logs = db.query("SELECT l.timestamp, u.username, u.email, l.ip_address FROM login_logs l JOIN users u ON l.user_id = u.id ORDER BY l.timestamp DESC LIMIT 10")
-    
-    logs_data = [{"timestamp": row['timestamp'], "username": f"{row['username']} ({row['email']})", "ip": row['ip_address']} for row in recent_logs]
-    
-    return jsonify({
-        "total_visits": total_visits,
-        "total_users": total_users,
-        "total_institutions": total_institutions,
-        "recent_logs": logs_data
-    })
+@app.route('/api/admin/stream', methods=['GET'])
+def admin_stream():
+    """Live dashboard as Server-Sent Events: a snapshot, then counter deltas and new logins. Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # Subscribe before reading the snapshot so nothing published in between is missed
+    subscription = event_bus.subscribe()
+    snapshot = admin_snapshot()
+
+    def stream():
+        try:
+            yield format_sse('snapshot', snapshot)
+            while True:
+                events, overflowed = subscription.take(ADMIN_STREAM_KEEPALIVE)
+                if not events and not overflowed:
+                    yield ': keepalive\n\n'
+                for name, data in events:
+                    yield format_sse(name, data)
+                if overflowed:
+                    # Fell too far behind: start over from the snapshot all lagging streams share
+                    yield format_sse('snapshot', shared_admin_snapshot())
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
+def admin_snapshot():
+    """The full admin dashboard payload."""
+    stats = Stats(db)
+    counters = stats.counters()
+    return {
+        "total_visits": counters.get('visits', 0),
+        "total_users": counters.get('users', 0),
+        "total_institutions": counters.get('institutions', 0),
+        "recent_logs": stats.recent_logs(10),
+        "visits_daily": stats.visits_by_day(30),
+        "visits_hourly": stats.visits_by_hour(48)
+    }
+
+def publish_logins(batch):
+    """Tells live dashboards about written logins, in the same shape as Stats.recent_logs rows."""
+    event_bus.publish('counters', {"visits": len(batch)})
+    if not event_bus.stats()['subscribers']:
+        return
+    user_ids = list({user_id for user_id, _, _ in batch})
+    rows = db.query(f"SELECT id, username, email FROM users WHERE id IN ({','.join('?' * len(user_ids))})", user_ids)
+    names = {row['id']: f"{row['username']} ({row['email']})" for row in rows}
+    for user_id, ip, timestamp in batch:
+        event_bus.publish('login', {"timestamp": timestamp, "username": names.get(user_id), "ip": ip})
+
+login_log_writer.on_written = publish_logins
+
+_admin_snapshot_lock = threading.Lock()
+_shared_snapshot = (0.0, None)  # (time.monotonic() when computed, snapshot)
+
+def shared_admin_snapshot(max_age=ADMIN_SNAPSHOT_MAX_AGE):
+    """The last snapshot published to admin streams, recomputed once when older than max_age."""
+    global _shared_snapshot
+    with _admin_snapshot_lock:
+        computed, snapshot = _shared_snapshot
+        if snapshot is None or time.monotonic() - computed > max_age:
+            snapshot = admin_snapshot()
+            _shared_snapshot = (time.monotonic(), snapshot)
+        return snapshot
+
+def _publish_catalog_change(version, changed):
+    # The new totals are read once here and shared by every connected stream
+    if event_bus.stats()['subscribers']:
+        event_bus.publish('snapshot', shared_admin_snapshot(max_age=0))
+
+catalog_cache.subscribe(_publish_catalog_change)
+
+@app.route('/api/admin/import', methods=['POST'])
+def admin_import():
+    """Bulk-loads institutions from an uploaded CSV or GeoJSON file. Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "Missing file"}), 400
+    fmt = request.form.get('format') or detect_format(upload.filename)
+
+    stream = io.TextIOWrapper(upload.stream, encoding='utf-8', newline='')
+    try:
+        report = InstitutionImporter(db).load_file(stream, fmt)
+    except (ImportFailed, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(report)
+
+@app.route('/api/admin/institutions/<int:institution_id>', methods=['DELETE'])
+def admin_delete_institution(institution_id):
+    """Deletes an institution. Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    if not Institution(db, id=institution_id).delete():
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"success": True})
+
+@app.route('/api/admin/visits', methods=['GET'])
+def admin_visits():
+    """Visits and unique users per day for ?from=YYYY-MM-DD&to=YYYY-MM-DD (default: last 30 days). Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+
+    today = datetime.datetime.utcnow().date()
+    try:
+        end = datetime.date.fromisoformat(request.args.get('to', today.isoformat()))
+        start = datetime.date.fromisoformat(request.args.get('from', (end - datetime.timedelta(days=29)).isoformat()))
+    except ValueError:
+        return jsonify({"error": "Invalid date"}), 400
+    if start > end:
+        return jsonify({"error": "Invalid date range"}), 400
+    return jsonify(Stats(db).visits_between(start.isoformat(), end.isoformat()))
+
+@app.route('/api/admin/retention', methods=['POST'])
+def admin_retention():
+    """Runs a login log partition/archive pass now. Only for admin."""
+    if not _is_admin():
+        return jsonify({"error": "Unauthorized"}), 403
+    return jsonify(login_log_retention.run())
+
+def _is_admin(sess=session):
+    return 'user_id' in sess and sess.get('email') == 'admin@luanda.ao'
 
 @app.route('/api/logout', methods=['POST'])
 def logout():
@@ -111,14 +394,284 @@ def logout():
 
 @app.route('/api/institutions', methods=['GET'])
 def get_institutions():
-    """Returns list of all institutions."""
+    """Returns list of all institutions (served from the catalog cache).
+
+    ?limit=&cursor= switches to keyset pagination; ?format=ndjson (or
+    Accept: application/x-ndjson) streams one institution per line.
+    """
     if 'user_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
-    
-    inst_model = Institution(db)
-    data = inst_model.get_all()
+
+    cursor = _cursor_arg()
+    if cursor is None:
+        return jsonify({"error": "Invalid cursor"}), 400
+    if _wants_ndjson():
+        return _stream_institutions(cursor)
+    if 'limit' in request.args or 'cursor' in request.args:
+        return _institutions_page(cursor)
+
+    # A warm cache answers without touching SQLite or re-serializing
+    if catalog_snapshot is not None:
+        catalog_snapshot.current()  # throttled check for a snapshot written by another worker
+    entry = catalog_cache.get(load_catalog)
+    if any(request.if_none_match.contains(etag) for etag in entry.all_etags()):
+        return _not_modified(entry)
+
+    encoding = _pick_encoding(entry)
+    body = entry.bodies[encoding]
+    # Snapshot bodies are memoryviews over the shared mapping: copy one slice at a time, not the whole body
+    response = Response(body if isinstance(body, bytes) else _chunks(body), mimetype='application/json')
+    response.content_length = len(body)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(entry.etag_for(encoding))
+    response.headers['Cache-Control'] = CATALOG_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+def load_catalog():
+    """Catalog cache loader: the shared snapshot when enabled and current, else a query."""
+    if catalog_snapshot is not None:
+        entry = catalog_snapshot.catalog_entry()
+        if entry is not None:
+            return entry
+    return Institution(db).get_all()
+
+def catalog_reader():
+    """Where id and spatial lookups read rows: the shared snapshot when it holds this worker's changes, else the database."""
+    snapshot = catalog_snapshot.fresh() if catalog_snapshot is not None else None
+    return snapshot if snapshot is not None else Institution(db)
+
+def _chunks(view):
+    for start in range(0, len(view), CATALOG_CHUNK_SIZE):
+        yield bytes(view[start:start + CATALOG_CHUNK_SIZE])
+
+def _cursor_arg(req=request):
+    """The ?cursor= of a keyset page (0 when absent); None when it is not an integer."""
+    try:
+        return int(req.args.get('cursor', 0))
+    except ValueError:
+        return None
+
+def _wants_ndjson(req=request):
+    if req.args.get('format') == 'ndjson':
+        return True
+    accept = req.accept_mimetypes
+    return accept.quality('application/x-ndjson') > accept.quality('application/json')
+
+def _institutions_page(cursor):
+    """One keyset page: items with id > cursor, plus the cursor for the next page."""
+    limit = request.args.get('limit', default=100, type=int)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # Fetch one extra row to know whether another page exists
+    items = Institution(db).get_page(cursor, limit + 1)
+    next_cursor = items[limit - 1]['id'] if len(items) > limit else None
+    return jsonify({"items": items[:limit], "next_cursor": next_cursor})
+
+def _stream_institutions(cursor):
+    """Streams institutions as NDJSON in constant memory.
+
+    Reads one keyset page at a time, so no pooled connection is held while a slow client reads.
+    """
+    def generate():
+        institution = Institution(db)
+        after = cursor
+        while True:
+            page = institution.get_page(after, NDJSON_PAGE_SIZE)
+            if not page:
+                break
+            yield ''.join(json.dumps(inst, ensure_ascii=False, separators=(',', ':')) + '\n' for inst in page)
+            after = page[-1]['id']
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def _pick_encoding(entry, req=request):
+    """Chooses the best precompressed body the client accepts."""
+    for encoding in ('br', 'gzip'):
+        if encoding in entry.bodies and req.accept_encodings[encoding]:
+            return encoding
+    return None
+
+def _not_modified(entry):
+    response = Response(status=304)
+    response.set_etag(entry.etag_for(_pick_encoding(entry)))
+    response.headers['Cache-Control'] = CATALOG_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/institutions/changes', methods=['GET'])
+def institution_changes():
+    """Delta sync: institutions inserted, updated or deleted after ?since=<version> (opaque when sharded)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    since = request.args.get('since', default='0')
+    limit = max(1, min(request.args.get('limit', default=MAX_PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    response = jsonify(Institution(db).changes_since(since, limit))
+    response.headers['Cache-Control'] = 'private, no-store'
+    return response
+
+@app.route('/api/institutions/nearest', methods=['GET'])
+def nearest_institutions():
+    """Returns the k institutions nearest to ?lat=&lng=."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    k = request.args.get('k', default=10, type=int)
+    if not valid_coordinates(lat, lng):
+        return jsonify({"error": "Invalid coordinates"}), 400
+    k = max(1, min(k, MAX_NEAREST))
+
+    data = catalog_reader().find_nearest(lat, lng, k)
+    return jsonify(data)
+
+@app.route('/api/distances', methods=['POST'])
+def batch_distances():
+    """Distances from many origins to the institutions.
+
+    Body: {"origins": [[lat, lng], ...], "k": 5, "type": "University"}. With k,
+    returns the k nearest institutions per origin; without it, the full
+    origin x institution matrix. The response is streamed row by row.
+    """
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    origins = _parse_origins(data.get('origins'))
+    if origins is None:
+        return jsonify({"error": "Invalid origins"}), 400
+    if len(origins) > MAX_DISTANCE_ORIGINS:
+        return jsonify({"error": f"Too many origins (max {MAX_DISTANCE_ORIGINS})"}), 400
+    k = data.get('k')
+    if k is not None:
+        if not isinstance(k, int) or isinstance(k, bool):
+            return jsonify({"error": "Invalid k"}), 400
+        k = max(1, min(k, MAX_NEAREST))
+
+    targets, rows = Institution(db).distance_matrix(origins, k=k, type=data.get('type'))
+
+    def generate():
+        dumps = lambda value: json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+        if k:
+            yield '{"results":['
+        else:
+            yield '{"institutions":' + dumps([{"id": t['id'], "name": t['name'], "type": t['type']} for t in targets]) + ',"distances":['
+        for i, row in enumerate(rows):
+            yield (',' if i else '') + dumps(row)
+        yield ']}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+def _parse_origins(values):
+    """Accepts [[lat, lng], ...] or [{"lat": .., "lng": ..}, ...]; None if anything is invalid."""
+    if not isinstance(values, list) or not values:
+        return None
+    origins = []
+    for value in values:
+        try:
+            lat, lng = (value['lat'], value['lng']) if isinstance(value, dict) else value
+            lat, lng = float(lat), float(lng)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not valid_coordinates(lat, lng):
+            return None
+        origins.append((lat, lng))
+    return origins
+
+@app.route('/api/institutions/bbox', methods=['GET'])
+def institutions_in_bbox():
+    """Returns institutions inside the viewport ?bbox=west,south,east,north."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    bbox = parse_bbox(request.args.get('bbox'))
+    if bbox is None:
+        return jsonify({"error": "Invalid bbox"}), 400
+    limit = request.args.get('limit', default=MAX_BBOX_RESULTS, type=int)
+    limit = max(1, min(limit, MAX_BBOX_RESULTS))
+
+    data = catalog_reader().find_in_bbox(*bbox, limit=limit)
+    return jsonify(data)
+
+@app.route('/api/institutions/clusters', methods=['GET'])
+def institution_clusters():
+    """Returns clusters and single institutions for the map viewport (?zoom=&bbox=)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    zoom = request.args.get('zoom', type=int)
+    bbox = parse_bbox(request.args.get('bbox'))
+    if zoom is None or zoom < 0 or bbox is None:
+        return jsonify({"error": "Invalid zoom or bbox"}), 400
+
+    return jsonify(cluster_index.query(zoom, *bbox))
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def vector_tile(z, x, y):
+    """Returns institution points as a Mapbox Vector Tile."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+    if z > tile_cache.max_zoom or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({"error": "Invalid tile"}), 404
+
+    data, etag = tile_cache.get(z, x, y)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = CATALOG_CACHE_CONTROL
+    return response
+
+@app.route('/api/search', methods=['GET'])
+def search_institutions():
+    """Full-text search over institution names, courses and details (?q=)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    q = request.args.get('q', '').strip()
+    limit = request.args.get('limit', default=20, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+    data = Institution(db).search(q, limit) if q else []
     return jsonify(data)
 
+@app.route('/api/autocomplete', methods=['GET'])
+def autocomplete():
+    """Prefix suggestions (names, acronyms, localities) for the search box (?q=, accents optional)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = request.args.get('limit', default=8, type=int)
+    limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+    return jsonify(autocomplete_index.suggest(request.args.get('q', ''), limit))
+
+@app.route('/api/courses/<path:course>/institutions', methods=['GET'])
+def course_institutions(course):
+    """Returns the institutions offering a course (slug or name, accents optional)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    info, institutions = course_catalog.institutions_for(course, type=request.args.get('type'))
+    if info is None:
+        return jsonify({"error": "Course not found"}), 404
+    return jsonify({"course": info, "count": len(institutions), "institutions": institutions})
+
+@app.route('/api/courses/facets', methods=['GET'])
+def course_facets():
+    """Returns institution counts per course and per institution type (?type= filters)."""
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    limit = request.args.get('limit', type=int)
+    return jsonify({
+        "courses": course_catalog.facets(type=request.args.get('type'), limit=limit),
+        "types": course_catalog.type_facets()
+    })
+
 # --- Seeding Data (For Demo Purposes) ---
 def seed_data():
     """Seeds the database with initial data if empty."""
@@ -128,8 +681,7 @@ def seed_data():
         print("Seeding admin user...")
         User(db, email="admin@luanda.ao", username="Administrador", password="Luanda2026").create()
 
-    inst_model = Institution(db)
-    if not inst_model.get_all():
+    if not Institution(db).has_any():
         print("Seeding institutions...")
         # Universities in Luanda
         institutions = [
@@ -374,19 +926,15 @@ def seed_data():
                 "courses": "Gestão, Direito, Economia, Eng. Informática, Cinema e TV"
             }
         ]
-        for item in institutions:
-            Institution(db, 
-                        name=item['name'], 
-                        type=item['type'], 
-                        latitude=item['lat'], 
-                        longitude=item['lng'], 
-                        details=item['details'], 
-                        website=item['website'],
-                        ranking=item.get('ranking', 'N/A'),
-                        courses=item.get('courses', 'Vários cursos disponíveis')
-            ).create()
+        InstitutionImporter(db).load(institutions)
+
+STARTUP_SECONDS = time.perf_counter() - _import_started
 
 if __name__ == '__main__':
+    print(f"App imported in {STARTUP_SECONDS * 1000:.1f} ms")
     seed_data()
+    retention_hours = float(os.environ.get('LOGIN_LOG_RETENTION_INTERVAL_HOURS', 24))
+    if retention_hours > 0:
+        login_log_retention.start(retention_hours * 3600)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
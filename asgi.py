@@ -0,0 +1,228 @@
+"""Async (ASGI) serving mode.
+
+The hot API routes are served by async Quart handlers whose SQLite calls run
+on AsyncDatabase's bounded executor, so idle or slow clients cost an event
+loop slot instead of a thread. Every other route falls through to the Flask
+app from app.py (run on a thread pool by Hypercorn's WSGI middleware), and
+both share the same database, caches, metrics and session cookie.
+
+Requires `pip install quart hypercorn`. Run with:
+    hypercorn asgi:application --bind 0.0.0.0:5000
+or:
+    python asgi.py
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, request, jsonify, session, g, Response
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app, db, login_log_writer, catalog_snapshot, load_catalog, seed_data, admin_snapshot, shared_admin_snapshot, _cursor_arg, _wants_ndjson, _pick_encoding, _is_admin, CATALOG_CACHE_CONTROL, MAX_PAGE_SIZE, NDJSON_PAGE_SIZE, ADMIN_STREAM_KEEPALIVE
+from src.async_database import AsyncDatabase
+from src.catalog_cache import catalog_cache
+from src.events import event_bus, format_sse
+from src.metrics import metrics
+from src.models.institution import Institution
+from src.models.user import User
+from src.passwords import password_hasher
+
+app = Quart(__name__)
+app.secret_key = flask_app.secret_key  # sessions are interchangeable with the Flask routes
+
+# SQLite calls run on their own executor, sized to the connection pool
+adb = AsyncDatabase(db)
+
+# Password hashing waits on the scrypt process pool; keep those waits off the database threads
+auth_executor = ThreadPoolExecutor(max_workers=password_hasher.max_workers * 2, thread_name_prefix="auth")
+
+async def run_auth(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(auth_executor, fn, *args)
+
+# --- Instrumentation ---
+
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+async def record_request(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+    return response
+
+@app.after_serving
+async def shutdown():
+    adb.close()
+    auth_executor.shutdown(wait=False)
+
+# --- Routes ---
+
+@app.route('/api/register', methods=['POST'])
+async def register():
+    """Handles user registration."""
+    data = await request.get_json()
+    email = data.get('email')
+    username = data.get('username')
+    password = data.get('password')
+
+    if await adb.run(User(db).find_by_email, email):
+        return jsonify({"success": False, "message": "E-mail já cadastrado"}), 400
+
+    # Hash on the auth threads (waiting on the scrypt pool), insert on the database executor
+    user = User(db, email=email, username=username, password=await run_auth(password_hasher.hash, password))
+    await adb.run(user.insert)
+    event_bus.publish('counters', {"users": 1})
+    return jsonify({"success": True, "message": "Conta criada com sucesso!"})
+
+@app.route('/api/login', methods=['POST'])
+async def login():
+    """Handles user login and logs the visit."""
+    data = await request.get_json()
+    email = data.get('email')
+    password = data.get('password')
+
+    found_user = await adb.run(User(db).find_by_email, email)
+    matches, new_hash = await run_auth(found_user.check_password, password) if found_user else (False, None)
+    if new_hash is not None:
+        await adb.run(found_user.save_password, new_hash)
+
+    if matches:
+        session['user_id'] = found_user.id
+        session['username'] = found_user.username
+        session['email'] = found_user.email
+
+        # Only enqueues; the writer thread inserts the batch, then publishes it
+        login_log_writer.log(found_user.id, request.remote_addr)
+
+        is_admin = (found_user.email == 'admin@luanda.ao')
+        return jsonify({"success": True, "message": "Login successful", "is_admin": is_admin})
+
+    return jsonify({"success": False, "message": "Credenciais inválidas"}), 401
+
+@app.route('/api/admin/stats', methods=['GET'])
+async def admin_stats():
+    """Returns visit statistics. Only for admin."""
+    if not _is_admin(session):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    # One executor hop for the whole dashboard instead of one per query
+    return jsonify(await adb.run(admin_snapshot))
+
+@app.route('/api/admin/stream', methods=['GET'])
+async def admin_stream():
+    """Live dashboard as Server-Sent Events. An idle stream costs no thread, only an event loop slot."""
+    if not _is_admin(session):
+        return jsonify({"error": "Unauthorized"}), 403
+
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def waker():
+        try:
+            loop.call_soon_threadsafe(wake.set)
+        except RuntimeError:  # loop already closed
+            pass
+
+    subscription = event_bus.subscribe(waker)
+    snapshot = await adb.run(admin_snapshot)
+
+    async def stream():
+        try:
+            yield format_sse('snapshot', snapshot).encode('utf-8')
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), ADMIN_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield b': keepalive\n\n'
+                    continue
+                wake.clear()
+                events, overflowed = subscription.take(0)
+                for name, data in events:
+                    yield format_sse(name, data).encode('utf-8')
+                if overflowed:
+                    yield format_sse('snapshot', await adb.run(shared_admin_snapshot)).encode('utf-8')
+        finally:
+            subscription.close()
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None  # streams stay open until the client goes away
+    return response
+
+@app.route('/api/institutions', methods=['GET'])
+async def get_institutions():
+    """Returns list of all institutions (served from the catalog cache).
+
+    Supports the same ?limit=&cursor= pagination and NDJSON streaming as the Flask route.
+    """
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    cursor = _cursor_arg(request)
+    if cursor is None:
+        return jsonify({"error": "Invalid cursor"}), 400
+    if _wants_ndjson(request):
+        return Response(_stream_institutions(cursor), mimetype='application/x-ndjson')
+    if 'limit' in request.args or 'cursor' in request.args:
+        limit = max(1, min(request.args.get('limit', default=100, type=int), MAX_PAGE_SIZE))
+        items = await adb.run(Institution(db).get_page, cursor, limit + 1)
+        next_cursor = items[limit - 1]['id'] if len(items) > limit else None
+        return jsonify({"items": items[:limit], "next_cursor": next_cursor})
+
+    # A warm cache answers on the event loop without an executor hop
+    if catalog_snapshot is not None and catalog_snapshot.needs_check():
+        await adb.run(catalog_snapshot.current)
+    entry = catalog_cache.peek() or await adb.run(catalog_cache.get, load_catalog)
+    encoding = _pick_encoding(entry, request)
+    if any(request.if_none_match.contains(etag) for etag in entry.all_etags()):
+        response = Response('', status=304)
+    else:
+        response = Response(bytes(entry.bodies[encoding]), mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(entry.etag_for(encoding))
+    response.headers['Cache-Control'] = CATALOG_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+async def _stream_institutions(cursor):
+    """Streams institutions page by page, so no database thread is held while the client reads."""
+    institution = Institution(db)
+    while True:
+        page = await adb.run(institution.get_page, cursor, NDJSON_PAGE_SIZE)
+        if not page:
+            break
+        yield ''.join(json.dumps(inst, ensure_ascii=False, separators=(',', ':')) + '\n' for inst in page).encode('utf-8')
+        cursor = page[-1]['id']
+
+# --- ASGI entry point ---
+
+# Everything not routed above (pages, map, search, tiles, imports...) is served by Flask
+wsgi_fallback = AsyncioWSGIMiddleware(flask_app, max_body_size=int(os.environ.get('MAX_UPLOAD_BYTES', 64 * 1024 * 1024)))
+_routes = app.url_map.bind('')
+
+async def application(scope, receive, send):
+    """Dispatches HTTP requests to the async routes when they match, else to the Flask app."""
+    if scope['type'] == 'http':
+        try:
+            _routes.match(scope['path'], method=scope['method'])
+        except HTTPException:
+            await wsgi_fallback(scope, receive, send)
+            return
+    await app(scope, receive, send)
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    seed_data()
+    config = Config()
+    config.bind = [f"0.0.0.0:{int(os.environ.get('PORT', 5000))}"]
+    asyncio.run(serve(application, config))
@@ -0,0 +1,63 @@
+import json
+import os
+import re
+
+# Logical bundles and the source files (relative to the static folder) they are built from, in load order
+BUNDLES = {
+    "js/map.js": ["js/MapManager.js", "js/Auth.js", "js/App.js"],
+    "js/auth.js": ["js/Auth.js"],
+    "css/style.css": ["css/style.css"],
+}
+
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Built files are named <bundle>.<first HASH_LENGTH hex digits of their sha256>.<ext>
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r'[\w/-]+\.[0-9a-f]{%d}\.(js|css)' % HASH_LENGTH)
+
+# Built files never change (their name is their hash), so browsers may cache them forever
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+class AssetManifest:
+    """Maps logical bundle names to the content-hashed files written by build_assets.py.
+
+    Without a build (development), the asset_urls template helper falls back
+    to the individual source files, so the templates work either way.
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist_folder = os.path.join(static_folder, DIST_DIR)
+        self.assets = {}
+        self._by_file = {}
+        self.load()
+
+    def load(self):
+        """(Re)reads the manifest; a missing one means serving the sources."""
+        try:
+            with open(os.path.join(self.dist_folder, MANIFEST), encoding='utf-8') as f:
+                self.assets = json.load(f).get("assets", {})
+        except FileNotFoundError:
+            self.assets = {}
+        self._by_file = {entry["file"]: entry for entry in self.assets.values()}
+        return self
+
+    def file_for(self, name):
+        """Built filename (relative to the dist folder) for a bundle, or None when not built."""
+        entry = self.assets.get(name)
+        return entry["file"] if entry else None
+
+    @staticmethod
+    def is_asset(filename):
+        """True for a content-hashed bundle name (older builds included), not the manifest or a .gz/.br file."""
+        return HASHED_NAME.fullmatch(filename) is not None
+
+    def variant(self, filename, accept_encodings):
+        """Picks the precompressed file to send: (filename on disk, Content-Encoding or None)."""
+        entry = self._by_file.get(filename)
+        if entry is not None:
+            for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+                if encoding in entry.get("encodings", []) and accept_encodings[encoding]:
+                    return filename + suffix, encoding
+        return filename, None
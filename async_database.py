@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncDatabase:
+    """Awaitable facade over Database for the ASGI app.
+
+    sqlite3 has no async API, so every call runs on a dedicated thread pool
+    sized to the connection pool: the event loop never blocks on disk I/O and
+    thousands of idle client connections cost no threads at all. Only requests
+    that are actually touching SQLite hold one of the pool_size threads.
+    """
+
+    def __init__(self, db, max_workers=None):
+        self.db = db
+        self.max_workers = max_workers or db.pool_size
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="db")
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs a blocking callable (e.g. a model method) on the database executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def query(self, query, params=(), one=False):
+        """Executes a SELECT query."""
+        return await self.run(self.db.query, query, params, one)
+
+    async def execute(self, query, params=()):
+        """Executes an INSERT, UPDATE, DELETE query."""
+        return await self.run(self.db.execute, query, params)
+
+    async def executemany(self, query, seq_of_params):
+        """Executes a statement for every parameter set in a single transaction."""
+        return await self.run(self.db.executemany, query, list(seq_of_params))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
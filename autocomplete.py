@@ -0,0 +1,127 @@
+import bisect
+import re
+import threading
+
+from src.catalog_cache import catalog_cache
+from src.text import fold
+
+# Words not worth starting a suggestion from ("Universidade de ..." is not found by "de")
+STOPWORDS = {'a', 'o', 'as', 'os', 'de', 'da', 'do', 'das', 'dos', 'e', 'em', 'na', 'no'}
+
+# Lower sorts first: an acronym hit beats a name prefix, which beats a word inside the name
+WEIGHTS = {"acronym": 0, "name": 1, "word": 2, "locality": 3}
+
+# Entries in the matching range looked at per query; keeps single letters as cheap as full words
+MAX_SCAN = 200
+
+def _split_name(name):
+    """Splits 'Universidade Agostinho Neto (UAN)' into its name and acronyms."""
+    acronyms = re.findall(r'\(([^)]+)\)', name or '')
+    return re.sub(r'\s*\([^)]*\)', '', name or '').strip(), [a.strip() for a in acronyms if a.strip()]
+
+def _localities(details):
+    """Locality names in a details string ('Benfica/Talatona', 'Sapu, Talatona')."""
+    return [part.strip() for part in re.split(r'[,/;]', details or '') if part.strip()]
+
+
+class AutocompleteIndex:
+    """Accent-insensitive prefix index over institution names, acronyms and localities.
+
+    Every searchable key is folded (see text.fold) and kept in one sorted list
+    of (key, weight, label, kind, institution id) tuples, so a prefix lookup is
+    a bisect plus a short forward scan. Names are indexed from the start and
+    from every word, so 'oscar' finds 'Universidade Óscar Ribas'. The list is
+    updated in place from catalog cache notifications.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.RLock()
+        self._stale = True
+        self._entries = []
+        self._entries_of = {}   # institution id -> its tuples in _entries
+        catalog_cache.subscribe(self._on_catalog_change)
+
+    # --- Maintenance ---
+
+    @staticmethod
+    def _keys(inst):
+        name, acronyms = _split_name(inst.get("name"))
+        keys = {}
+        for acronym in acronyms:
+            keys[(fold(acronym), "acronym", inst["name"])] = None
+        words = fold(name).split(' ')
+        if words and words[0]:
+            keys[(' '.join(words), "name", inst["name"])] = None
+        for i in range(1, len(words)):
+            if words[i] not in STOPWORDS:
+                keys[(' '.join(words[i:]), "word", inst["name"])] = None
+        for locality in _localities(inst.get("details")):
+            keys[(fold(locality), "locality", locality)] = None
+        return [(key, WEIGHTS[kind], label, kind, inst["id"]) for key, kind, label in keys if key]
+
+    def load(self):
+        """Rebuilds the index from the database."""
+        from src.models.institution import Institution
+
+        with self._lock:
+            self._entries_of = {inst["id"]: self._keys(inst) for inst in Institution(self.db).iter_all()}
+            self._entries = sorted(entry for entries in self._entries_of.values() for entry in entries)
+            self._stale = False
+
+    def _remove(self, inst_id):
+        for entry in self._entries_of.pop(inst_id, []):
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+
+    def _add(self, inst):
+        entries = self._keys(inst)
+        self._entries_of[inst["id"]] = entries
+        for entry in entries:
+            bisect.insort(self._entries, entry)
+
+    def _on_catalog_change(self, version, changed):
+        with self._lock:
+            if changed is None:
+                self._stale = True
+                return
+            if self._stale:
+                return
+            for inst in changed:
+                self._remove(inst["id"])
+                if not inst.get("deleted"):
+                    self._add(inst)
+
+    # --- Queries ---
+
+    def suggest(self, text, limit=8):
+        """Returns up to limit suggestions for a typed prefix, best first."""
+        prefix = fold(text)
+        if not prefix:
+            return []
+        with self._lock:
+            if self._stale:
+                self.load()
+            start = bisect.bisect_left(self._entries, (prefix,))
+            candidates = []
+            for entry in self._entries[start:start + MAX_SCAN]:
+                if not entry[0].startswith(prefix):
+                    break
+                candidates.append(entry)
+
+        # Exact matches first, then by kind, then shorter (more specific) labels
+        candidates.sort(key=lambda e: (e[0] != prefix, e[1], len(e[2]), e[2]))
+        results, seen = [], set()
+        for key, weight, label, kind, inst_id in candidates:
+            identity = ("locality", key) if kind == "locality" else ("institution", inst_id)
+            if identity in seen:
+                continue
+            seen.add(identity)
+            if kind == "locality":
+                results.append({"text": label, "kind": kind})
+            else:
+                results.append({"text": label, "kind": "institution", "id": inst_id, "match": kind})
+            if len(results) >= limit:
+                break
+        return results
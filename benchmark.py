@@ -0,0 +1,280 @@
+"""Reproducible benchmark and load test for the API routes.
+
+Every dataset size runs in its own subprocess against a fresh synthetic
+database, so results do not depend on the committed faculties.db.
+
+Usage:
+    python benchmark.py                                  # 10^2 and 10^4 rows, Flask test client
+    python benchmark.py --sizes 100,10000,1000000 --concurrency 1,8,32
+    python benchmark.py --server                         # drive a local threaded WSGI server
+    python benchmark.py --output bench_results.json
+
+Compare two runs with any JSON diff tool; each result row is keyed by
+(size, route, concurrency).
+"""
+import argparse
+import itertools
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROUTES = ('login', 'institutions', 'admin_stats', 'register')
+BENCH_PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'admin@luanda.ao'
+
+# Rough bounding box of Angola, for synthetic coordinates
+LAT_RANGE = (-18.0, -4.4)
+LNG_RANGE = (11.7, 24.0)
+
+# Unique suffixes for registered emails, across every run in the process
+_register_ids = itertools.count()
+
+# --- Synthetic data ---
+
+def generate_dataset(db, size, seed=42):
+    """Fills an empty database with `size` institutions, users and login_logs rows."""
+    from src.passwords import password_hasher
+    from src.importer import InstitutionImporter
+
+    rng = random.Random(seed)
+    types = ('University', 'Institute', 'Faculty')
+    courses = ('Direito', 'Medicina', 'Eng. Informática', 'Economia', 'Gestão', 'Arquitetura', 'Enfermagem', 'Psicologia')
+
+    institutions = (
+        {
+            "name": f"Instituição Sintética {i}",
+            "type": rng.choice(types),
+            "lat": rng.uniform(*LAT_RANGE),
+            "lng": rng.uniform(*LNG_RANGE),
+            "details": f"Bairro {i % 500}",
+            "website": f"https://inst{i}.ao",
+            "courses": ', '.join(rng.sample(courses, 3)),
+        }
+        for i in range(size)
+    )
+    InstitutionImporter(db, chunk_size=10000).load(institutions)
+
+    # One real hash shared by every synthetic user keeps generation fast
+    password = password_hasher.hash(BENCH_PASSWORD)
+    with db.transaction() as conn:
+        conn.execute("INSERT INTO users (email, username, password) VALUES (?, ?, ?)", (ADMIN_EMAIL, 'Administrador', password))
+        conn.executemany(
+            "INSERT INTO users (email, username, password) VALUES (?, ?, ?)",
+            ((f"user{i}@bench.ao", f"user{i}", password) for i in range(size)),
+        )
+    start = time.time() - 365 * 86400
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO login_logs (user_id, ip_address, timestamp) VALUES (?, ?, ?)",
+            (
+                (rng.randint(1, size + 1), f"10.0.{i % 256}.{rng.randint(1, 254)}",
+                 time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + rng.random() * 365 * 86400)))
+                for i in range(size)
+            ),
+        )
+
+# --- Clients ---
+
+class TestClient:
+    """Drives the app in-process through Flask's test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None):
+        response = self.client.open(path, method=method, json=body)
+        response.close()
+        return response.status_code
+
+
+class HttpClient:
+    """Drives a running server over a keep-alive HTTP connection, keeping the session cookie."""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.cookie = None
+
+    def request(self, method, path, body=None):
+        headers = {'Content-Type': 'application/json'}
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        self.conn.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            self.cookie = cookie.split(';', 1)[0]
+        return response.status
+
+
+def start_server(app):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# --- Measurement ---
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def run_route(make_client, route, size, concurrency, requests_per_level):
+    """Fires requests_per_level requests at one route from `concurrency` threads.
+
+    Clients are built and logged in first; a barrier then releases every
+    thread at once, and throughput counts only the measured requests.
+    """
+    # The barrier action runs once, in the last thread to arrive: that is the start of the timed window
+    started = []
+    barrier = threading.Barrier(concurrency, action=lambda: started.append(time.perf_counter()))
+
+    def worker(n):
+        client = make_client()
+        email = ADMIN_EMAIL if route in ('admin_stats', 'institutions') else f"user{random.randrange(size)}@bench.ao"
+        if route != 'register':
+            client.request('POST', '/api/login', {"email": email, "password": BENCH_PASSWORD})
+        barrier.wait()
+
+        latencies, errors = [], 0
+        for _ in range(n):
+            if route == 'login':
+                call = ('POST', '/api/login', {"email": email, "password": BENCH_PASSWORD})
+            elif route == 'institutions':
+                call = ('GET', '/api/institutions', None)
+            elif route == 'admin_stats':
+                call = ('GET', '/api/admin/stats', None)
+            else:
+                i = next(_register_ids)
+                call = ('POST', '/api/register', {"email": f"new{os.getpid()}-{i}@bench.ao", "username": f"new{i}", "password": BENCH_PASSWORD})
+            start = time.perf_counter()
+            status = client.request(*call)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors += 1
+        return latencies, errors, time.perf_counter()
+
+    shares = [requests_per_level // concurrency + (1 if i < requests_per_level % concurrency else 0) for i in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(worker, shares))
+    wall = max(end for _, _, end in outcomes) - started[0]
+
+    latencies = sorted(l for lat, _, _ in outcomes for l in lat)
+    errors = sum(e for _, e, _ in outcomes)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "size": size,
+        "route": route,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall > 0 else None,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+    }
+
+def run_size(args):
+    """Child process: builds one dataset and benchmarks every route against it."""
+    workdir = tempfile.mkdtemp(prefix=f"bench-{args.size}-")
+    os.environ['DATABASE_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ['TILE_CACHE_DIR'] = os.path.join(workdir, 'tiles')
+    os.chdir(workdir)
+
+    import app as app_module
+
+    gen_start = time.perf_counter()
+    generate_dataset(app_module.db, args.size)
+    generate_seconds = time.perf_counter() - gen_start
+
+    if args.server:
+        server = start_server(app_module.app)
+        make_client = lambda: HttpClient('127.0.0.1', server.server_port)
+    else:
+        make_client = lambda: TestClient(app_module.app)
+
+    results = []
+    for route in args.routes:
+        for concurrency in args.concurrency:
+            # Warm caches and pools so steady-state latency is measured
+            run_route(make_client, route, args.size, 1, min(5, args.requests))
+            results.append(run_route(make_client, route, args.size, concurrency, args.requests))
+            print(json.dumps(results[-1]), file=sys.stderr)
+
+    app_module.login_log_writer.close()
+    json.dump({"generate_seconds": round(generate_seconds, 3), "results": results}, sys.stdout)
+
+# --- Driver ---
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Luanda Locator API routes.")
+    parser.add_argument('--sizes', type=int_list, default=[100, 10000], help="dataset sizes, e.g. 100,10000,1000000")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 4, 16], help="client thread counts")
+    parser.add_argument('--requests', type=int, default=200, help="requests per route and concurrency level")
+    parser.add_argument('--routes', type=lambda v: v.split(','), default=list(ROUTES), help=f"subset of {','.join(ROUTES)}")
+    parser.add_argument('--server', action='store_true', help="use a local threaded WSGI server instead of the test client")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)  # internal: run one size in this process
+    args = parser.parse_args(argv)
+
+    if args.size is not None:
+        run_size(args)
+        return 0
+
+    report = {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": "server" if args.server else "test_client",
+            "requests_per_level": args.requests,
+        },
+        "datasets": [],
+        "results": [],
+    }
+    here = os.path.dirname(os.path.abspath(__file__))
+    for size in args.sizes:
+        cmd = [sys.executable, os.path.abspath(__file__), '--size', str(size),
+               '--concurrency', ','.join(map(str, args.concurrency)),
+               '--requests', str(args.requests), '--routes', ','.join(args.routes)]
+        if args.server:
+            cmd.append('--server')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])))
+        print(f"Benchmarking dataset of {size} rows...", file=sys.stderr)
+        child = json.loads(subprocess.check_output(cmd, env=env))
+        report["datasets"].append({"size": size, "generate_seconds": child["generate_seconds"]})
+        report["results"].extend(child["results"])
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
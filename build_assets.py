@@ -0,0 +1,242 @@
+"""Builds the static assets for production.
+
+Bundles and minifies the JS/CSS listed in src.assets.BUNDLES, writes them to
+static/dist under content-hashed names with .gz (and, when the brotli module
+is installed, .br) variants, and records them in static/dist/manifest.json.
+The templates pick the built files up through asset_urls(); the app serves
+them from /assets/ with a year-long immutable Cache-Control.
+
+Usage (from the project root):
+    python -m src.build_assets            # build, keeping older builds for pages still open
+    python -m src.build_assets --clean    # also delete files the new manifest does not use
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+
+from src.assets import BUNDLES, DIST_DIR, HASH_LENGTH, MANIFEST
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# The project's static folder (this file lives in src/)
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+# --- Minifiers ---
+
+# After these a '/' starts a regular expression rather than a division
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+_REGEX_KEYWORDS = {'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else', 'yield', 'await'}
+
+# A space next to one of these is never needed...
+_NO_SPACE = set('{}()[];,:=<>?!&|*%^~')
+# ...unless dropping it would glue two operators into a different one ('a - -b', 'a < !--b')
+_KEEP_SPACE = {('+', '+'), ('-', '-'), ('+', '-'), ('-', '+'), ('/', '/'), ('<', '!'), ('-', '>')}
+
+def _is_word(ch):
+    return ch.isalnum() or ch in '_$\\' or ord(ch) > 127
+
+def _copy_quoted(source, i, quote):
+    """Returns the index just past the string starting at i."""
+    i += 1
+    while i < len(source) and source[i] != quote:
+        i += 2 if source[i] == '\\' else 1
+    return i + 1
+
+def _copy_regex(source, i):
+    """Returns the index just past the regex body starting at i (flags are read as a word)."""
+    i += 1
+    in_class = False
+    while i < len(source):
+        ch = source[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            return i + 1
+        i += 1
+    return i
+
+def minify_js(source):
+    """Strips comments and indentation; strings, template literals and regexes are copied untouched.
+
+    Line breaks between statements are kept, so automatic semicolon
+    insertion works exactly as in the source.
+    """
+    out = []
+    i, n = 0, len(source)
+    space = newline = False
+    last, word = '', ''
+    templates = []  # brace depth at which each open ${...} returns to its template literal
+    depth = 0
+
+    def emit(text, first):
+        nonlocal space, newline
+        if out:
+            prev = out[-1][-1]
+            if newline:
+                out.append('\n')
+            elif space and ((_is_word(prev) and _is_word(first)) or (prev, first) in _KEEP_SPACE
+                            or not (prev in _NO_SPACE or first in _NO_SPACE)):
+                out.append(' ')
+        out.append(text)
+        space = newline = False
+
+    def copy_template(i):
+        """Copies template text from i until the closing backtick or a '${'; returns the new index."""
+        start = i
+        while i < n:
+            if source[i] == '\\':
+                i += 2
+            elif source[i] == '`':
+                out.append(source[start:i + 1])
+                return i + 1, False
+            elif source.startswith('${', i):
+                out.append(source[start:i + 2])
+                return i + 2, True
+            else:
+                i += 1
+        out.append(source[start:])
+        return n, False
+
+    while i < n:
+        ch = source[i]
+        if ch in ' \t\r\n\f\v':
+            if ch == '\n':
+                newline = True
+            else:
+                space = True
+            i += 1
+        elif source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            i = n if end < 0 else end + 2
+            space = True
+        elif ch in '"\'':
+            end = _copy_quoted(source, i, ch)
+            emit(source[i:end], ch)
+            last, word, i = ch, '', end
+        elif ch == '`' or (ch == '}' and templates and depth == templates[-1]):
+            if ch == '}':
+                templates.pop()
+                out.append('}')
+            else:
+                emit('`', '`')
+            i, opened = copy_template(i + 1)
+            if opened:
+                templates.append(depth)
+                last, word = '{', ''
+            else:
+                last, word = '`', ''
+        elif ch == '/' and (not last or last in _REGEX_AFTER or word in _REGEX_KEYWORDS):
+            end = _copy_regex(source, i)
+            emit(source[i:end], ch)
+            last, word, i = '/', '', end
+        else:
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+            joined = _is_word(ch) and _is_word(last or ' ') and not (space or newline)
+            emit(ch, ch)
+            word = word + ch if joined else (ch if _is_word(ch) else '')
+            last = ch
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+def minify_css(source):
+    """Drops comments and needless whitespace, leaving strings alone."""
+    parts = re.split(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''', source)
+    for k in range(0, len(parts), 2):
+        text = re.sub(r'/\*.*?\*/', '', parts[k], flags=re.S)
+        text = re.sub(r'\s+', ' ', text)
+        text = re.sub(r'\s*([{};,>])\s*', r'\1', text)
+        text = re.sub(r':\s+', ':', text)
+        parts[k] = text.replace(';}', '}')
+    return ''.join(parts).strip() + '\n'
+
+# --- Build ---
+
+def _write(path, data):
+    """Writes a file atomically (a half-written asset must never be served)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.build-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.chmod(tmp_path, 0o644)  # mkstemp creates 0600; a front-end server may serve these directly
+    os.replace(tmp_path, path)
+
+def build(static_folder=STATIC_FOLDER, clean=False):
+    """Builds every bundle and writes the manifest last. Returns the manifest."""
+    dist = os.path.join(static_folder, DIST_DIR)
+    assets = {}
+    for name, sources in BUNDLES.items():
+        texts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+                texts.append(f.read())
+        if name.endswith('.js'):
+            body = ';\n'.join(minify_js(text) for text in texts)  # ';' so no file can run into the next
+        else:
+            body = ''.join(minify_css(text) for text in texts)
+        data = body.encode('utf-8')
+
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+        variants = {"": data, ".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(data, quality=11)
+        for suffix, content in variants.items():
+            _write(os.path.join(dist, filename + suffix), content)
+
+        assets[name] = {
+            "file": filename,
+            "sources": sources,
+            "encodings": [encoding for encoding, suffix in (('br', '.br'), ('gzip', '.gz')) if suffix in variants],
+            "bytes": {
+                "source": sum(len(text.encode('utf-8')) for text in texts),
+                "minified": len(data),
+                **{suffix.lstrip('.'): len(content) for suffix, content in variants.items() if suffix},
+            },
+        }
+
+    manifest = {"assets": assets}
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+
+    if clean:
+        keep = {MANIFEST} | {entry["file"] + suffix for entry in assets.values() for suffix in ('', '.gz', '.br')}
+        for root, _, files in os.walk(dist):
+            for file in files:
+                relative = os.path.relpath(os.path.join(root, file), dist).replace(os.sep, '/')
+                if relative not in keep:
+                    os.unlink(os.path.join(root, file))
+    return manifest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bundle, minify, hash and precompress the static assets.")
+    parser.add_argument('--static', default=STATIC_FOLDER, help="static folder (sources in, dist/ out)")
+    parser.add_argument('--clean', action='store_true', help="delete built files the new manifest does not reference")
+    args = parser.parse_args(argv)
+
+    manifest = build(args.static, clean=args.clean)
+    for name, entry in manifest["assets"].items():
+        sizes = entry["bytes"]
+        compressed = ', '.join(f"{key} {sizes[key]}" for key in ('gz', 'br') if key in sizes)
+        print(f"{name} -> {DIST_DIR}/{entry['file']}: {sizes['source']} -> {sizes['minified']} bytes ({compressed})")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import json
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+class CatalogEntry:
+    """One serialized version of the catalog and its precompressed bodies."""
+
+    def __init__(self, version, body):
+        self.version = version
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies = {
+            None: body,
+            "gzip": gzip.compress(body, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.bodies["br"] = brotli.compress(body, quality=11)
+
+    @classmethod
+    def prebuilt(cls, etag, bodies, version=None):
+        """An entry over already-serialized bodies (e.g. slices of a mapped snapshot)."""
+        entry = cls.__new__(cls)
+        entry.version = version
+        entry.etag = etag
+        entry.bodies = bodies
+        return entry
+
+    def etag_for(self, encoding):
+        """Strong ETag of the representation sent with the given content-encoding."""
+        return self.etag if encoding is None else f"{self.etag}-{encoding}"
+
+    def all_etags(self):
+        return [self.etag_for(encoding) for encoding in self.bodies]
+
+
+class CatalogCache:
+    """Process-level cache of the serialized institutions catalog.
+
+    Write paths call invalidate(), which bumps the version counter, drops the
+    cached entry and notifies subscribers (derived indexes, tile caches...).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._entry = None
+        self._listeners = []
+        self.version = 0
+
+    def get(self, loader):
+        """Returns the current entry, building it with loader() when missing.
+
+        loader() returns the list of institutions, or a ready CatalogEntry.
+        """
+        entry = self._entry
+        if entry is not None:
+            return entry
+
+        # Only one thread rebuilds; the others wait and reuse its result.
+        with self._build_lock:
+            entry = self._entry
+            if entry is not None:
+                return entry
+            version = self.version
+            data = loader()
+            if isinstance(data, CatalogEntry):
+                entry = data
+                entry.version = version
+            else:
+                body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                entry = CatalogEntry(version, body)
+            with self._lock:
+                if self.version == version:
+                    self._entry = entry
+            return entry
+
+    def peek(self):
+        """Returns the cached entry without building it (None when invalidated)."""
+        return self._entry
+
+    def invalidate(self, changed=None):
+        """Drops the cached catalog. `changed` lists the affected institutions, or None for all."""
+        with self._lock:
+            self.version += 1
+            self._entry = None
+            version = self.version
+        for listener in list(self._listeners):
+            listener(version, changed)
+
+    def subscribe(self, listener):
+        """Registers listener(version, changed) to be called on every invalidation."""
+        self._listeners.append(listener)
+        return listener
+
+
+catalog_cache = CatalogCache()
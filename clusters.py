@@ -0,0 +1,185 @@
+import math
+import threading
+
+from src.catalog_cache import catalog_cache
+
+def _project(lat, lng):
+    """Web Mercator projection to the unit square (x right, y down)."""
+    sin = math.sin(math.radians(max(-85.05112878, min(85.05112878, lat))))
+    x = lng / 360.0 + 0.5
+    y = 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+    return min(max(x, 0.0), 1.0), min(max(y, 0.0), 1.0)
+
+def _unproject(x, y):
+    lng = (x - 0.5) * 360.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+class ClusterIndex:
+    """Hierarchical grid clustering of institutions, one grid per zoom level.
+
+    At zoom z the world is split into 2^z * (256 / radius) cells per axis, so
+    every cell is exactly four cells at z + 1 and clusters nest across zooms.
+    Each cell keeps only a count and coordinate sums; point ids live in the
+    cells of the deepest level. Adding or removing a point touches one cell
+    per zoom, so catalog changes are applied incrementally. Only projected
+    coordinates are kept per point: the rows of single points are read from
+    source() (the shared snapshot or the database) when a query returns them.
+    """
+
+    def __init__(self, db, max_zoom=16, radius=64, source=None):
+        self.db = db
+        self.source = source or self._database
+        self.max_zoom = max_zoom
+        self.radius = radius
+        self._lock = threading.RLock()
+        self._stale = True
+        self._levels = []
+        self._points = {}
+        catalog_cache.subscribe(self._on_catalog_change)
+
+    # --- Maintenance ---
+
+    def _database(self):
+        from src.models.institution import Institution
+
+        return Institution(self.db)
+
+    def _cells_per_axis(self, zoom):
+        return (2 ** zoom) * (256 // self.radius)
+
+    def _cell(self, zoom, x, y):
+        n = self._cells_per_axis(zoom)
+        return min(int(x * n), n - 1), min(int(y * n), n - 1)
+
+    def rebuild(self):
+        """Rebuilds every level from the institutions table."""
+        from src.models.institution import Institution
+
+        with self._lock:
+            self._levels = [{} for _ in range(self.max_zoom + 1)]
+            self._points = {}
+            for inst in Institution(self.db).iter_all():
+                self._add(inst)
+            self._stale = False
+
+    def _add(self, inst):
+        if inst.get("latitude") is None or inst.get("longitude") is None:
+            return
+        x, y = _project(inst["latitude"], inst["longitude"])
+        self._points[inst["id"]] = (x, y)
+        for zoom, level in enumerate(self._levels):
+            key = self._cell(zoom, x, y)
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = [0, 0.0, 0.0, set() if zoom == self.max_zoom else None]
+            cell[0] += 1
+            cell[1] += x
+            cell[2] += y
+            if cell[3] is not None:
+                cell[3].add(inst["id"])
+
+    def _remove(self, inst_id):
+        entry = self._points.pop(inst_id, None)
+        if entry is None:
+            return
+        x, y = entry
+        for zoom, level in enumerate(self._levels):
+            key = self._cell(zoom, x, y)
+            cell = level[key]
+            cell[0] -= 1
+            if cell[0] == 0:
+                del level[key]
+                continue
+            cell[1] -= x
+            cell[2] -= y
+            if cell[3] is not None:
+                cell[3].discard(inst_id)
+
+    def _on_catalog_change(self, version, changed):
+        with self._lock:
+            if self._stale:
+                return
+            if changed is None:
+                self._stale = True  # bulk change: rebuild lazily on the next query
+                return
+            for inst in changed:
+                self._remove(inst["id"])
+                if not inst.get("deleted"):
+                    self._add(inst)
+
+    # --- Queries ---
+
+    def _single_point(self, zoom, key):
+        """Finds the only point in a count-1 cell by descending to the deepest level."""
+        cx, cy = key
+        for z in range(zoom + 1, self.max_zoom + 1):
+            level = self._levels[z]
+            children = ((cx * 2 + dx, cy * 2 + dy) for dx in (0, 1) for dy in (0, 1))
+            cx, cy = next(child for child in children if child in level)
+        (inst_id,) = self._levels[self.max_zoom][(cx, cy)][3]
+        return inst_id
+
+    def query(self, zoom, south, west, north, east):
+        """Returns clusters and single institutions visible at a zoom level inside a bbox."""
+        if west > east:
+            # Box crosses the antimeridian: split it in two.
+            return self.query(zoom, south, west, north, 180.0) + self.query(zoom, south, -180.0, north, east)
+
+        with self._lock:
+            if self._stale:
+                self.rebuild()
+
+            points_only = zoom > self.max_zoom
+            zoom = max(0, min(int(zoom), self.max_zoom))
+            level = self._levels[zoom]
+            cx0, cy0 = self._cell(zoom, *_project(north, west))
+            cx1, cy1 = self._cell(zoom, *_project(south, east))
+
+            # Walk whichever is smaller: the cells in the box or the occupied cells.
+            if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) < len(level):
+                keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1) if (cx, cy) in level]
+            else:
+                keys = [(cx, cy) for cx, cy in level if cx0 <= cx <= cx1 and cy0 <= cy <= cy1]
+
+            results, point_ids = [], []
+            for key in keys:
+                count, sx, sy, ids = level[key]
+                if count == 1:
+                    point_ids.append(self._single_point(zoom, key))
+                elif points_only:
+                    point_ids.extend(ids)
+                else:
+                    lat, lng = _unproject(sx / count, sy / count)
+                    results.append({
+                        "kind": "cluster",
+                        "count": count,
+                        "latitude": round(lat, 6),
+                        "longitude": round(lng, 6),
+                        "expansion_zoom": self._expansion_zoom(zoom, key),
+                    })
+
+        # Outside the lock: reading the source may sync the snapshot, which notifies this index
+        return [dict(inst, kind="point") for inst in self.source().get_many(point_ids)] + results
+
+    def _expansion_zoom(self, zoom, key):
+        """First zoom at which the cluster splits into more than one cell."""
+        cells = [key]
+        for z in range(zoom + 1, self.max_zoom + 1):
+            level = self._levels[z]
+            cells = [
+                (cx * 2 + dx, cy * 2 + dy)
+                for cx, cy in cells for dx in (0, 1) for dy in (0, 1)
+                if (cx * 2 + dx, cy * 2 + dy) in level
+            ]
+            if len(cells) > 1:
+                return z
+        return self.max_zoom + 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "points": len(self._points),
+                "cells": sum(len(level) for level in self._levels),
+                "stale": self._stale,
+            }
@@ -0,0 +1,218 @@
+import re
+import threading
+from collections import Counter
+
+from src.catalog_cache import catalog_cache
+from src.text import fold, tokens
+
+# Abbreviations expanded before a course name is normalized
+ABBREVIATIONS = {
+    "eng": "Engenharia",
+    "adm": "Administração",
+    "tec": "Tecnologia",
+}
+
+# Connectors ignored when comparing names ("Eng. Telecomunicações" == "Engenharia de Telecomunicações")
+STOPWORDS = {"de", "da", "do", "das", "dos", "em"}
+
+# Spelling variants of the same course, by key
+ALIASES = {
+    "engenharia-petroleos": "engenharia-petroleo",
+}
+
+def split_courses(text):
+    """Splits a comma-separated course list, ignoring commas inside parentheses."""
+    items, depth, current = [], 0, []
+    for ch in text or '':
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth = max(0, depth - 1)
+        if ch in ',;' and depth == 0:
+            items.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    items.append(''.join(current))
+    return [item.strip() for item in items if item.strip()]
+
+def expand_course(item):
+    """Expands 'Engenharia (Civil, Minas)' into one name per course; drops notes like '(Ex-ISUTIC)'."""
+    match = re.match(r'^(.*?)\s*\((.*)\)\s*(.*)$', item)
+    if not match:
+        return [item]
+    prefix, inner, suffix = match.groups()
+    if ',' in inner:
+        return [f"{prefix} {part.strip()} {suffix}".strip() for part in inner.split(',') if part.strip()]
+    return [f"{prefix} {suffix}".strip()]
+
+def normalize_course(name):
+    """Expands abbreviations and tidies spacing: 'Eng. Civil' -> 'Engenharia Civil'."""
+    words = []
+    for word in name.replace('.', '. ').split():
+        bare = fold(word).rstrip('.')
+        if bare in ABBREVIATIONS and (word.endswith('.') or bare == 'eng'):
+            word = ABBREVIATIONS[bare]
+        words.append(word)
+    return ' '.join(words).strip(' .')
+
+def course_slug(name):
+    """Canonical key of a course name: folded words without connectors, joined by '-'."""
+    slug = '-'.join(t for t in tokens(normalize_course(name)) if t not in STOPWORDS)
+    return ALIASES.get(slug, slug)
+
+def parse_courses(text):
+    """Returns [(slug, display name)] for a free-text courses field, without duplicates."""
+    seen = {}
+    for item in split_courses(text):
+        for name in expand_course(item):
+            name = normalize_course(name)
+            slug = course_slug(name)
+            if slug and slug not in seen:
+                seen[slug] = name
+    return list(seen.items())
+
+
+def link_courses(conn, institutions):
+    """Rewrites the course links of (institution id, courses text) pairs.
+
+    Runs on the caller's connection, inside the transaction that wrote the
+    institutions; the links of deleted institutions go with a trigger.
+    """
+    for inst_id, text in institutions:
+        conn.execute("DELETE FROM institution_courses WHERE institution_id = ?", (inst_id,))
+        parsed = parse_courses(text)
+        conn.executemany("INSERT OR IGNORE INTO courses (slug, name) VALUES (?, ?)", parsed)
+        conn.executemany(
+            "INSERT OR IGNORE INTO institution_courses (institution_id, course_id) SELECT ?, id FROM courses WHERE slug = ?",
+            [(inst_id, slug) for slug, _ in parsed],
+        )
+    conn.execute("DELETE FROM courses WHERE NOT EXISTS (SELECT 1 FROM institution_courses WHERE course_id = courses.id)")
+
+
+class CourseCatalog:
+    """In-memory inverted index (course -> institutions) over the normalized course tables.
+
+    The courses/institution_courses tables are written together with the
+    institutions (see link_courses). The index is loaded from them once and
+    then kept current from catalog cache notifications, so facet counts never
+    touch SQLite. Only ids and types are kept per institution; the rows a
+    lookup returns are read from source() (the shared snapshot or the
+    database).
+    """
+
+    QUERY = '''
+        SELECT ic.institution_id, c.slug, c.name FROM institution_courses ic
+        JOIN courses c ON c.id = ic.course_id
+    '''
+
+    def __init__(self, db, source=None):
+        self.db = db
+        self.source = source or self._database
+        self._lock = threading.RLock()
+        self._stale = True
+        self._names = {}           # slug -> display name
+        self._postings = {}        # slug -> set of institution ids
+        self._facets = {}          # slug -> Counter(type)
+        self._types = {}           # id -> institution type
+        self._courses_of = {}      # id -> list of slugs
+        catalog_cache.subscribe(self._on_catalog_change)
+
+    # --- In-memory index ---
+
+    def load(self):
+        """Rebuilds the inverted index from the normalized tables (course links live in each institution's shard)."""
+        from src.models.institution import Institution
+
+        with self._lock:
+            self._types = {inst["id"]: inst["type"] for inst in Institution(self.db).iter_all()}
+            self._names, self._postings, self._facets, self._courses_of = {}, {}, {}, {}
+            for rows in self.db.fan_out(lambda shard: shard.query(self.QUERY)):
+                for row in rows:
+                    self._names.setdefault(row['slug'], row['name'])
+                    self._index(row['institution_id'], row['slug'])
+            self._stale = False
+
+    def _database(self):
+        from src.models.institution import Institution
+
+        return Institution(self.db)
+
+    @staticmethod
+    def _summary(inst):
+        return {key: inst[key] for key in ("id", "name", "type", "latitude", "longitude")}
+
+    def _index(self, inst_id, slug):
+        if inst_id not in self._types:
+            return
+        self._postings.setdefault(slug, set()).add(inst_id)
+        self._facets.setdefault(slug, Counter())[self._types[inst_id]] += 1
+        self._courses_of.setdefault(inst_id, []).append(slug)
+
+    def _unindex(self, inst_id):
+        type = self._types.pop(inst_id, None)
+        for slug in self._courses_of.pop(inst_id, []):
+            self._postings[slug].discard(inst_id)
+            self._facets[slug][type] -= 1
+            if not self._postings[slug]:
+                del self._postings[slug]
+                del self._facets[slug]
+
+    def _on_catalog_change(self, version, changed):
+        # The tables were written with the institutions: only the in-memory index changes here
+        with self._lock:
+            if changed is None:
+                self._stale = True  # bulk change: reload on the next lookup
+                return
+            if self._stale:
+                return
+            for inst in changed:
+                self._unindex(inst["id"])
+                if inst.get("deleted"):
+                    continue
+                self._types[inst["id"]] = inst["type"]
+                for slug, name in parse_courses(inst.get("courses")):
+                    self._names.setdefault(slug, name)
+                    self._index(inst["id"], slug)
+
+    # --- Queries ---
+
+    def _ensure_loaded(self):
+        if self._stale:
+            self.load()
+
+    def institutions_for(self, course, type=None):
+        """Returns (course info, institutions) offering a course given by slug or free-text name."""
+        with self._lock:
+            self._ensure_loaded()
+            slug = course if course in self._postings else course_slug(course)
+            ids = self._postings.get(slug)
+            if not ids:
+                return None, []
+            ids = [i for i in ids if not type or self._types[i] == type]  # a copy: read outside the lock
+            info = {"slug": slug, "name": self._names.get(slug, slug)}
+        # Outside the lock: reading the source may sync the snapshot, which notifies this index
+        return info, [self._summary(inst) for inst in self.source().get_many(ids)]
+
+    def facets(self, type=None, limit=None):
+        """Returns courses with institution counts, overall and per institution type."""
+        with self._lock:
+            self._ensure_loaded()
+            results = []
+            for slug, by_type in self._facets.items():
+                total = by_type[type] if type else sum(by_type.values())
+                if total:
+                    results.append({
+                        "slug": slug,
+                        "name": self._names.get(slug, slug),
+                        "count": total,
+                        "by_type": {t: n for t, n in by_type.items() if n},
+                    })
+        results.sort(key=lambda item: (-item["count"], item["slug"]))
+        return results[:limit] if limit else results
+
+    def type_facets(self):
+        """Returns institution counts per type."""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(Counter(self._types.values()))
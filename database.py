@@ -1,84 +1,245 @@
+import logging
 import sqlite3
 import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from src.metrics import metrics
+from src.migrations import migrate
+
+logger = logging.getLogger(__name__)
 
 class Database:
-    def __init__(self, db_file="faculties.db"):
+    # Tuned per-connection settings. WAL lets readers run alongside the single
+    # writer; NORMAL sync is durable in WAL mode and avoids an fsync per commit.
+    PRAGMAS = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA cache_size = -16000",      # ~16 MB page cache per connection
+        "PRAGMA mmap_size = 268435456",    # 256 MB memory-mapped I/O
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 5000",
+    )
+
+    def __init__(self, db_file="faculties.db", pool_size=8, timeout=10.0, cached_statements=256):
         self.db_file = db_file
         self.conn = None
-        self._create_tables()
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+
+        self._lock = threading.Lock()
+        self._reset_pool()
+
+        # Schema migrations run lazily, on the first connection this process opens
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self.startup = {"migrations_applied": [], "migrate_seconds": None}
+
+    def _reset_pool(self):
+        """(Re)initializes the connection pool for the current process."""
+        self._pid = os.getpid()
+        self._pool = queue.LifoQueue(maxsize=self.pool_size)
+        self._opened = 0
+        self._stats = {"opened": 0, "checkouts": 0, "reused": 0, "waits": 0, "discarded": 0}
 
     def get_connection(self):
-        """Creates a database connection."""
-        conn = sqlite3.connect(self.db_file)
+        """Creates a new, tuned database connection."""
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=self.timeout,
+            check_same_thread=False,  # connections move between threads, but only via the pool
+            cached_statements=self.cached_statements,
+        )
         conn.row_factory = sqlite3.Row
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        if not self._schema_ready:
+            self._ensure_schema(conn)
         return conn
 
-    def _create_tables(self):
-        """Creates tables if they don't exist."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
+    def _ensure_schema(self, conn):
+        """Applies pending migrations once per process (a no-op PRAGMA read when up to date)."""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            start = time.perf_counter()
+            try:
+                self.startup["migrations_applied"] = migrate(conn)
+            except Exception:
+                logger.exception("Error migrating database")
+                raise
+            self.startup["migrate_seconds"] = time.perf_counter() - start
+            self._schema_ready = True
+
+    def _checkout(self):
+        """Takes a connection from the pool, opening one if the pool is not full yet."""
+        if os.getpid() != self._pid:
+            # Forked worker (e.g. gunicorn): never reuse the parent's connections.
+            with self._lock:
+                if os.getpid() != self._pid:
+                    self._reset_pool()
+
+        pool = self._pool
+        with self._lock:
+            self._stats["checkouts"] += 1
         try:
-            # Users Table with Email
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT UNIQUE NOT NULL,
-                    username TEXT NOT NULL,
-                    password TEXT NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Institutions Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS institutions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    type TEXT NOT NULL, -- University, Faculty, Institute
-                    latitude REAL,
-                    longitude REAL,
-                    details TEXT,
-                    website TEXT,
-                    ranking TEXT,
-                    courses TEXT
-                )
-            ''')
-
-            # Login Logs Table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS login_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    ip_address TEXT,
-                    FOREIGN KEY(user_id) REFERENCES users(id)
-                )
-            ''')
-            
-            conn.commit()
-        except Exception as e:
-            print(f"Error creating tables: {e}")
+            conn = pool.get_nowait()
+            with self._lock:
+                self._stats["reused"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.pool_size
+            if can_open:
+                self._opened += 1
+                self._stats["opened"] += 1
+            else:
+                self._stats["waits"] += 1
+        if can_open:
+            try:
+                return self.get_connection()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return pool.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a pooled database connection")
+
+    def _checkin(self, conn, broken=False):
+        """Returns a connection to the pool (or discards it if it is unusable)."""
+        if os.getpid() == self._pid and not broken:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._pool.put_nowait(conn)
+                return
+            except queue.Full:
+                pass
+        with self._lock:
+            if os.getpid() == self._pid:
+                self._opened -= 1
+            self._stats["discarded"] += 1
+        conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled connection for the duration of the block."""
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except sqlite3.DatabaseError as e:
+            # Keep the connection unless SQLite reports it as unusable.
+            broken = not isinstance(e, (sqlite3.IntegrityError, sqlite3.OperationalError, sqlite3.ProgrammingError))
+            raise
         finally:
+            self._checkin(conn, broken)
+
+    @contextmanager
+    def transaction(self):
+        """Runs the block inside a single transaction on one pooled connection."""
+        with self.connection() as conn:
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+    # --- Shards (a single file is one shard; see sharding.ShardedDatabase) ---
+
+    def shards(self):
+        """Database files holding institutions, main file first."""
+        return [self]
+
+    def shard_for(self, region=None, latitude=None, longitude=None):
+        """The shard that owns an institution at these coordinates (or in this region)."""
+        return self
+
+    def shard_name(self, shard):
+        """Stable name of a shard (used in delta sync cursors)."""
+        return "main"
+
+    def fan_out(self, fn):
+        """Calls fn(shard) for every shard and returns the results in shards() order."""
+        return [fn(shard) for shard in self.shards()]
+
+    def stats(self):
+        """Returns connection pool statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open"] = self._opened
+        stats["idle"] = self._pool.qsize()
+        stats["in_use"] = stats["open"] - stats["idle"]
+        stats["pool_size"] = self.pool_size
+        return stats
+
+    def close(self):
+        """Closes all idle pooled connections."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._opened -= 1
             conn.close()
 
+    @contextmanager
+    def _timed(self, query):
+        """Records the statement's latency (including pool wait) in the metrics registry."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            metrics.observe_query(query, time.perf_counter() - start, failed)
+
     def query(self, query, params=(), one=False):
         """Executes a SELECT query."""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        try:
+        with self._timed(query), self.connection() as conn:
             cursor = conn.execute(query, params)
             rv = cursor.fetchall()
             return (rv[0] if rv else None) if one else rv
-        finally:
-            conn.close()
+
+    def iterate(self, query, params=(), batch_size=500):
+        """Yields rows of a SELECT lazily, holding one pooled connection until exhausted."""
+        with self.connection() as conn:
+            with self._timed(query):
+                cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
 
     def execute(self, query, params=()):
         """Executes an INSERT, UPDATE, DELETE query."""
-        conn = self.get_connection()
-        try:
-            cursor = conn.execute(query, params)
-            conn.commit()
+        with self._timed(query), self.connection() as conn:
+            try:
+                cursor = conn.execute(query, params)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
             return cursor.lastrowid
-        finally:
-            conn.close()
+
+    def executemany(self, query, seq_of_params):
+        """Executes a statement for every parameter set in a single transaction."""
+        with self._timed(query), self.connection() as conn:
+            try:
+                cursor = conn.executemany(query, seq_of_params)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            return cursor.rowcount
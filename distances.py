@@ -0,0 +1,76 @@
+import heapq
+
+from src.geo import EARTH_RADIUS_KM, haversine_km
+
+_numpy = None
+_numpy_checked = False
+
+def load_numpy():
+    """Imports numpy on first use (optional, and slow enough to matter at startup). None if missing."""
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:  # distances fall back to a Python loop
+            _numpy = None
+        _numpy_checked = True
+    return _numpy
+
+# Upper bound on origin x target cells computed at once (~8 MB per float64 temporary)
+DEFAULT_MAX_CELLS = 1_000_000
+
+def haversine_matrix(lat1, lng1, lat2, lng2):
+    """Great-circle distances (km) between every origin and every target, via NumPy broadcasting.
+
+    lat1/lng1 are the m origins and lat2/lng2 the n targets, in degrees; returns an (m, n) array.
+    """
+    numpy = load_numpy()
+    phi1 = numpy.radians(numpy.asarray(lat1, dtype=numpy.float64))[:, None]
+    phi2 = numpy.radians(numpy.asarray(lat2, dtype=numpy.float64))[None, :]
+    dlmb = numpy.radians(numpy.asarray(lng2, dtype=numpy.float64)[None, :] - numpy.asarray(lng1, dtype=numpy.float64)[:, None])
+    a = numpy.sin((phi2 - phi1) / 2) ** 2 + numpy.cos(phi1) * numpy.cos(phi2) * numpy.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * numpy.arcsin(numpy.sqrt(numpy.clip(a, 0.0, 1.0)))
+
+def distance_rows(origins, targets, k=None, max_cells=DEFAULT_MAX_CELLS):
+    """Yields one result per origin, in order.
+
+    origins are (lat, lng) pairs and targets dicts with latitude/longitude.
+    With k, each result is the list of (target index, distance_km) of the k
+    closest targets, nearest first; otherwise it is the list of distances to
+    every target. Origins are processed in chunks of max_cells // len(targets)
+    rows, so memory stays bounded whatever the number of origins.
+    """
+    if not targets:
+        for _ in origins:
+            yield []
+        return
+    if k is not None:
+        k = min(k, len(targets))
+
+    numpy = load_numpy()
+    if numpy is None:
+        for lat, lng in origins:
+            row = [haversine_km(lat, lng, t['latitude'], t['longitude']) for t in targets]
+            yield heapq.nsmallest(k, enumerate(row), key=lambda item: item[1]) if k else row
+        return
+
+    target_lat = numpy.array([t['latitude'] for t in targets], dtype=numpy.float64)
+    target_lng = numpy.array([t['longitude'] for t in targets], dtype=numpy.float64)
+    chunk_rows = max(1, max_cells // len(targets))
+
+    origins = list(origins)
+    for start in range(0, len(origins), chunk_rows):
+        chunk = numpy.array(origins[start:start + chunk_rows], dtype=numpy.float64).reshape(-1, 2)
+        block = haversine_matrix(chunk[:, 0], chunk[:, 1], target_lat, target_lng)
+        if not k:
+            yield from block.tolist()
+            continue
+        # argpartition finds the k smallest in O(n); only those k get sorted
+        nearest = numpy.argpartition(block, k - 1, axis=1)[:, :k] if k < len(targets) else numpy.tile(numpy.arange(len(targets)), (len(block), 1))
+        nearest_distances = numpy.take_along_axis(block, nearest, axis=1)
+        order = numpy.argsort(nearest_distances, axis=1)
+        nearest = numpy.take_along_axis(nearest, order, axis=1).tolist()
+        nearest_distances = numpy.take_along_axis(nearest_distances, order, axis=1).tolist()
+        for indexes, distances in zip(nearest, nearest_distances):
+            yield list(zip(indexes, distances))
@@ -0,0 +1,94 @@
+import json
+import threading
+from collections import deque
+
+class Subscription:
+    """One subscriber's bounded event buffer.
+
+    A subscriber that falls max_queue events behind loses its buffer and is
+    flagged as overflowed instead of growing without bound; it is expected to
+    reload a full snapshot and carry on from there.
+    """
+
+    def __init__(self, bus, max_queue, waker=None):
+        self.bus = bus
+        self.max_queue = max_queue
+        self._waker = waker
+        self._events = deque()
+        self._overflowed = False
+        self._cond = threading.Condition()
+
+    def push(self, event):
+        """Called by the bus on the publishing thread; never blocks."""
+        with self._cond:
+            if len(self._events) >= self.max_queue:
+                dropped = len(self._events) + 1
+                self._events.clear()
+                self._overflowed = True
+            else:
+                dropped = 0
+                self._events.append(event)
+            self._cond.notify()
+        if self._waker is not None:
+            self._waker()
+        return dropped
+
+    def take(self, timeout=None):
+        """Returns (events, overflowed) once something arrived, or ([], False) after timeout seconds."""
+        with self._cond:
+            if not self._events and not self._overflowed and timeout != 0:
+                self._cond.wait(timeout)
+            events, overflowed = list(self._events), self._overflowed
+            self._events.clear()
+            self._overflowed = False
+        return events, overflowed
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe for live dashboards.
+
+    publish() hands the event to every current subscriber's buffer and
+    returns; it never waits on a slow reader. Events are (name, data) pairs.
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._stats = {"published": 0, "dropped": 0}
+
+    def subscribe(self, waker=None):
+        """Registers a subscriber. waker, if given, is called (on the publishing thread) after each event."""
+        subscription = Subscription(self, self.max_queue, waker)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, name, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._stats["published"] += 1
+        dropped = sum(subscription.push((name, data)) for subscription in subscribers)
+        if dropped:
+            with self._lock:
+                self._stats["dropped"] += dropped
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["subscribers"] = len(self._subscribers)
+        return stats
+
+
+def format_sse(name, data):
+    """Serializes one Server-Sent Events message."""
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+event_bus = EventBus()
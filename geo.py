@@ -0,0 +1,65 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points, in kilometres."""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def bounding_box(lat, lng, radius_km):
+    """Returns (south, west, north, east) of a box containing the circle of radius_km around a point."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south = max(-90.0, lat - dlat)
+    north = min(90.0, lat + dlat)
+
+    cos_lat = math.cos(math.radians(lat))
+    if south <= -90.0 or north >= 90.0 or cos_lat < 1e-9:
+        return south, -180.0, north, 180.0
+    # Widest point of the circle on the sphere (not the flat r / cos(lat), which falls short)
+    ratio = math.sin(radius_km / EARTH_RADIUS_KM) / cos_lat
+    if ratio >= 1.0:
+        return south, -180.0, north, 180.0
+    dlng = math.degrees(math.asin(ratio))
+    if dlng >= 180.0 or lng - dlng < -180.0 or lng + dlng > 180.0:
+        # Wraps the antimeridian: fall back to the full longitude range.
+        return south, -180.0, north, 180.0
+    return south, lng - dlng, north, lng + dlng
+
+def find_nearest(find_in_bbox, lat, lng, k, max_radius_km):
+    """The k rows nearest to a point, closest first, with distance_km, from widening find_in_bbox boxes."""
+    radius = 2.0
+    while True:
+        candidates = find_in_bbox(*bounding_box(lat, lng, radius))
+        for inst in candidates:
+            inst["distance_km"] = round(haversine_km(lat, lng, inst["latitude"], inst["longitude"]), 3)
+        candidates.sort(key=lambda inst: inst["distance_km"])
+
+        # The box contains the whole circle, so once the k-th candidate lies
+        # inside the radius nothing outside the box can be closer.
+        if len(candidates) >= k and candidates[k - 1]["distance_km"] <= radius:
+            return candidates[:k]
+        if radius >= max_radius_km:
+            return candidates[:k]
+        if len(candidates) >= k:
+            radius = min(max_radius_km, candidates[k - 1]["distance_km"] + 0.001)
+        else:
+            radius = min(max_radius_km, radius * 4)
+
+def parse_bbox(value):
+    """Parses a Leaflet-style 'west,south,east,north' string into (south, west, north, east)."""
+    try:
+        west, south, east, north = (float(v) for v in value.split(','))
+    except (AttributeError, ValueError):
+        return None
+    if not (-90.0 <= south <= north <= 90.0 and -180.0 <= west <= 180.0 and -180.0 <= east <= 180.0):
+        return None
+    return south, west, north, east
+
+def valid_coordinates(lat, lng):
+    """Checks that a latitude/longitude pair is within range."""
+    return lat is not None and lng is not None and -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
@@ -0,0 +1,315 @@
+"""Bulk institution loader for CSV and GeoJSON files.
+
+Usage:
+    python -m src.importer institutions.csv
+    python -m src.importer campuses.geojson --db faculties.db --chunk-size 5000
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import sys
+import time
+from contextlib import ExitStack
+
+from src.catalog_cache import catalog_cache
+from src.courses import link_courses
+from src.geo import valid_coordinates
+
+# Accepted spellings for the coordinate columns
+LAT_KEYS = ('latitude', 'lat')
+LNG_KEYS = ('longitude', 'lng', 'lon', 'long')
+
+# Text columns; GeoJSON properties may hold numbers (kept as text) or anything else (rejected)
+TEXT_KEYS = ('name', 'type', 'details', 'website', 'ranking', 'courses')
+
+class ImportFailed(Exception):
+    """Raised when an import cannot run at all (as opposed to per-row validation errors)."""
+
+class InstitutionImporter:
+    """Streams institution records into the database with chunked, single-transaction upserts.
+
+    The institution name is the natural key: an existing row with the same
+    name is updated in place, anything else is inserted. Names are only
+    unique per database file, so a row whose new coordinates route it to
+    another shard is deleted from the old one and inserted in the new one.
+    """
+
+    MAX_REPORTED_ERRORS = 100
+
+    UPSERT = '''
+        INSERT INTO institutions (name, type, latitude, longitude, details, website, ranking, courses)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            type = excluded.type,
+            latitude = excluded.latitude,
+            longitude = excluded.longitude,
+            details = excluded.details,
+            website = excluded.website,
+            ranking = excluded.ranking,
+            courses = excluded.courses
+    '''
+
+    def __init__(self, db, chunk_size=5000):
+        self.db = db
+        self.chunk_size = chunk_size
+
+    # --- Readers ---
+
+    @staticmethod
+    def read_csv(stream):
+        """Yields one dict per CSV row."""
+        try:
+            yield from csv.DictReader(stream)
+        except csv.Error as e:
+            raise ImportFailed(f"Invalid CSV: {e}")
+
+    @staticmethod
+    def read_geojson(stream):
+        """Yields records from a FeatureCollection or from newline-delimited features."""
+        first = stream.readline()
+        if first.strip() and not _is_complete_json(first.strip().lstrip('\x1e')):
+            # A single pretty-printed document spanning several lines
+            for feature in _features(_parse_json(first + stream.read())):
+                yield _feature_to_record(feature)
+            return
+
+        for line in itertools.chain([first], stream):
+            line = line.strip().lstrip('\x1e')  # RFC 8142 record separator
+            if not line:
+                continue
+            for feature in _features(_parse_json(line)):
+                yield _feature_to_record(feature)
+
+    def read(self, stream, fmt):
+        if fmt == 'csv':
+            return self.read_csv(stream)
+        if fmt == 'geojson':
+            return self.read_geojson(stream)
+        raise ImportFailed(f"Unsupported format: {fmt}")
+
+    # --- Validation ---
+
+    def validate(self, record):
+        """Returns (row tuple, None) for a valid record or (None, error message)."""
+        text = {}
+        for key in TEXT_KEYS:
+            value = record.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = str(value)
+            elif value is not None and not isinstance(value, str):
+                return None, f"invalid {key}"
+            text[key] = value
+        name = (text['name'] or '').strip()
+        if not name:
+            return None, "missing name"
+        lat = _first_float(record, LAT_KEYS)
+        lng = _first_float(record, LNG_KEYS)
+        if not valid_coordinates(lat, lng):
+            return None, "invalid coordinates"
+        return (
+            name,
+            (text['type'] or 'Institute').strip(),
+            lat,
+            lng,
+            text['details'],
+            text['website'],
+            text['ranking'] or 'N/A',
+            text['courses'] or 'Vários cursos disponíveis',
+        ), None
+
+    # --- Loading ---
+
+    def load(self, records):
+        """Upserts all valid records in one transaction (per shard) and returns a report."""
+        report = {"rows": 0, "inserted": 0, "updated": 0, "skipped": 0, "errors": []}
+        start = time.perf_counter()
+
+        with ExitStack() as stack:
+            transactions = {}
+
+            def transaction_for(shard):
+                # Rows are routed by coordinates; each shard gets one transaction, opened on first use
+                if shard.db_file not in transactions:
+                    conn = stack.enter_context(shard.transaction())
+                    try:
+                        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_institutions_name ON institutions(name)")
+                    except Exception as e:
+                        raise ImportFailed(f"Institution names are not unique, cannot upsert by name: {e}")
+                    transactions[shard.db_file] = conn
+                return transactions[shard.db_file]
+
+            numbered = enumerate(records, start=1)
+            while True:
+                batch = list(itertools.islice(numbered, self.chunk_size))
+                if not batch:
+                    break
+
+                chunk = []
+                for line, record in batch:
+                    report["rows"] += 1
+                    row, error = self.validate(record)
+                    if error:
+                        report["skipped"] += 1
+                        if len(report["errors"]) < self.MAX_REPORTED_ERRORS:
+                            report["errors"].append({"record": line, "error": error})
+                        continue
+                    chunk.append(row)
+                if not chunk:
+                    continue
+
+                # A name repeated within the chunk is one row, written last-wins
+                unique = {row[0]: row for row in chunk}
+                report["updated"] += len(chunk) - len(unique)
+
+                by_shard = {}
+                for row in unique.values():
+                    shard = self.db.shard_for(latitude=row[2], longitude=row[3])
+                    by_shard.setdefault(shard, []).append(row)
+                moved = set()
+                for shard, inst_id, name in self._rows_elsewhere(by_shard, transactions):
+                    transaction_for(shard).execute("DELETE FROM institutions WHERE id = ?", (inst_id,))
+                    moved.add(name)
+                report["updated"] += len(moved)
+
+                for shard, rows in by_shard.items():
+                    conn = transaction_for(shard)
+                    existing = self._existing_courses(conn, [row[0] for row in rows])
+                    conn.executemany(self.UPSERT, rows)
+                    report["updated"] += len(existing)
+                    report["inserted"] += sum(1 for row in rows if row[0] not in existing and row[0] not in moved)
+                    # Course links follow in the same transaction, for new rows and changed course lists only
+                    relink = {row[0]: row[7] for row in rows if row[0] not in existing or existing[row[0]] != row[7]}
+                    link_courses(conn, [(row['id'], relink[row['name']]) for row in self._select_names(conn, "id, name", list(relink))])
+
+            # Dependent indexes: compact the FTS index and refresh planner statistics once
+            for conn in transactions.values():
+                conn.execute("INSERT INTO institutions_fts(institutions_fts) VALUES ('optimize')")
+                conn.execute("PRAGMA optimize")
+
+        # A single invalidation rebuilds every in-memory derived index.
+        catalog_cache.invalidate()
+
+        seconds = time.perf_counter() - start
+        report["seconds"] = round(seconds, 3)
+        report["rows_per_sec"] = round(report["rows"] / seconds, 1) if seconds > 0 else None
+        return report
+
+    def _rows_elsewhere(self, by_shard, transactions):
+        """(shard, id, name) of existing rows named like a row routed to a different shard."""
+        if len(self.db.shards()) == 1:
+            return []
+        target = {row[0]: shard.db_file for shard, rows in by_shard.items() for row in rows}
+
+        def lookup(shard):
+            # A shard already written by this import is read in its transaction, to see those rows
+            conn = transactions.get(shard.db_file)
+            if conn is not None:
+                rows = self._select_names(conn, "id, name", list(target))
+            else:
+                with shard.connection() as conn:
+                    rows = self._select_names(conn, "id, name", list(target))
+            return [(shard, row['id'], row['name']) for row in rows if target[row['name']] != shard.db_file]
+
+        return [found for rows in self.db.fan_out(lookup) for found in rows]
+
+    @classmethod
+    def _existing_courses(cls, conn, names):
+        """Maps the given names already in the table to their courses text."""
+        return {row['name']: row['courses'] for row in cls._select_names(conn, "name, courses", names)}
+
+    @staticmethod
+    def _select_names(conn, columns, names):
+        """Selects columns of the institutions with the given names, in batches of 500."""
+        rows = []
+        for i in range(0, len(names), 500):
+            batch = names[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows += conn.execute(f"SELECT {columns} FROM institutions WHERE name IN ({placeholders})", batch).fetchall()
+        return rows
+
+    def load_file(self, stream, fmt):
+        return self.load(self.read(stream, fmt))
+
+
+def _is_complete_json(line):
+    try:
+        json.loads(line)
+        return True
+    except ValueError:
+        return False
+
+def _parse_json(text):
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        raise ImportFailed(f"Invalid GeoJSON: {e}")
+
+def _features(obj):
+    """The features of a FeatureCollection, or a single feature."""
+    if not isinstance(obj, dict):
+        raise ImportFailed("Invalid GeoJSON: expected a FeatureCollection or Feature object")
+    if obj.get('type') != 'FeatureCollection' and 'features' not in obj:
+        return [obj]
+    features = obj.get('features', [])
+    if not isinstance(features, list):
+        raise ImportFailed("Invalid GeoJSON: 'features' must be a list")
+    return features
+
+def _feature_to_record(feature):
+    if not isinstance(feature, dict):
+        raise ImportFailed("Invalid GeoJSON: every feature must be an object")
+    properties = feature.get('properties') or {}
+    geometry = feature.get('geometry') or {}
+    if not isinstance(properties, dict) or not isinstance(geometry, dict):
+        raise ImportFailed("Invalid GeoJSON: feature properties and geometry must be objects")
+    record = dict(properties)
+    if geometry.get('type') == 'Point':
+        coords = geometry.get('coordinates') or []
+        if isinstance(coords, list) and len(coords) >= 2:
+            record['longitude'], record['latitude'] = coords[0], coords[1]
+    return record
+
+def _first_float(record, keys):
+    for key in keys:
+        value = record.get(key)
+        if value not in (None, ''):
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+def detect_format(filename):
+    lowered = (filename or '').lower()
+    if lowered.endswith(('.geojson', '.geojsonl', '.geojsons', '.json', '.ndjson')):
+        return 'geojson'
+    return 'csv'
+
+
+def main(argv=None):
+    from src.sharding import ShardedDatabase
+
+    parser = argparse.ArgumentParser(description="Bulk-load institutions from CSV or GeoJSON.")
+    parser.add_argument('path', help="input file ('-' for stdin)")
+    parser.add_argument('--format', choices=('csv', 'geojson'), help="input format (default: from extension)")
+    parser.add_argument('--db', default='faculties.db', help="SQLite database file")
+    parser.add_argument('--shard-map', default='shards.json', help="per-province shard map (if present)")
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    importer = InstitutionImporter(ShardedDatabase(args.db, args.shard_map), chunk_size=args.chunk_size)
+    if args.path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8', newline='')
+        report = importer.load_file(stream, fmt)
+    else:
+        with open(args.path, encoding='utf-8', newline='') as stream:
+            report = importer.load_file(stream, fmt)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0 if report["skipped"] == 0 else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
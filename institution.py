@@ -1,4 +1,20 @@
+import heapq
+import html
+import re
+import sqlite3
+
+from src.geo import find_nearest
+from src.distances import distance_rows, DEFAULT_MAX_CELLS
+from src.catalog_cache import catalog_cache
+from src.courses import link_courses
+
+# Private-use markers put around FTS matches; replaced with <mark> after escaping.
+_HL_START, _HL_END = '\ue000', '\ue001'
+
 class Institution:
+    # Maximum search radius before find_nearest gives up widening its box.
+    MAX_SEARCH_RADIUS_KM = 20040.0
+
     def __init__(self, db, id=None, name=None, type=None, latitude=None, longitude=None, details=None, website=None, ranking=None, courses=None):
         self.db = db
         self.id = id
@@ -11,31 +27,279 @@ class Institution:
         self.ranking = ranking
         self.courses = courses
 
+    @staticmethod
+    def to_dict(row):
+        """Converts an institutions row into the API representation."""
+        return {
+            "id": row['id'],
+            "name": row['name'],
+            "type": row['type'],
+            "latitude": row['latitude'],
+            "longitude": row['longitude'],
+            "details": row['details'],
+            "website": row['website'],
+            "ranking": row['ranking'],
+            "courses": row['courses']
+        }
+
+    @staticmethod
+    def _merge(results, limit=None):
+        """Joins per-shard results into one list in id order (a row caught mid-move is listed once)."""
+        if len(results) == 1:
+            return results[0]
+        by_id = {inst["id"]: inst for rows in results for inst in rows}
+        merged = [by_id[i] for i in sorted(by_id)]
+        return merged[:limit] if limit else merged
+
     def get_all(self):
         """Retrieves all institutions."""
         query = "SELECT * FROM institutions"
-        rows = self.db.query(query)
-        institutions = []
-        if rows:
-            for row in rows:
-                institutions.append({
-                    "id": row['id'],
-                    "name": row['name'],
-                    "type": row['type'],
-                    "latitude": row['latitude'],
-                    "longitude": row['longitude'],
-                    "details": row['details'],
-                    "website": row['website'],
-                    "ranking": row['ranking'],
-                    "courses": row['courses']
-                })
-        return institutions
+        results = self.db.fan_out(lambda shard: [self.to_dict(row) for row in shard.query(query)])
+        return self._merge(results)
+
+    def has_any(self):
+        """Checks whether any institution exists without reading the table."""
+        return any(self.db.fan_out(lambda shard: shard.query("SELECT 1 FROM institutions LIMIT 1", one=True) is not None))
+
+    def get_page(self, after_id=0, limit=100):
+        """Retrieves up to `limit` institutions with id > after_id (keyset pagination)."""
+        query = "SELECT * FROM institutions WHERE id > ? ORDER BY id LIMIT ?"
+        results = self.db.fan_out(lambda shard: [self.to_dict(row) for row in shard.query(query, (after_id, limit))])
+        return self._merge(results, limit)
+
+    def get_many(self, ids):
+        """Retrieves institutions by id, in id order (unknown ids are skipped)."""
+        ids = sorted(set(ids))
+
+        def fetch(shard):
+            rows = []
+            for start in range(0, len(ids), 500):  # stays under SQLite's bound parameter limit
+                chunk = ids[start:start + 500]
+                query = f"SELECT * FROM institutions WHERE id IN ({','.join('?' * len(chunk))}) ORDER BY id"
+                rows += [self.to_dict(row) for row in shard.query(query, chunk)]
+            return rows
+
+        return self._merge(self.db.fan_out(fetch)) if ids else []
+
+    def iter_all(self, after_id=0):
+        """Yields every institution in id order straight off the cursor (one cursor per shard)."""
+        query = "SELECT * FROM institutions WHERE id > ? ORDER BY id"
+        cursors = [shard.iterate(query, (after_id,)) for shard in self.db.shards()]
+        last_id = None
+        for row in heapq.merge(*cursors, key=lambda row: row['id']):
+            if row['id'] != last_id:
+                last_id = row['id']
+                yield self.to_dict(row)
+
+    def find_in_bbox(self, south, west, north, east, limit=None):
+        """Retrieves institutions inside a bounding box using the R*Tree index."""
+        if west > east:
+            # Box crosses the antimeridian: split it in two.
+            left = self.find_in_bbox(south, west, north, 180.0, limit)
+            right = self.find_in_bbox(south, -180.0, north, east, limit)
+            results = left + right
+            return results[:limit] if limit else results
+
+        query = '''
+            SELECT i.* FROM institutions_rtree r
+            JOIN institutions i ON i.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lng >= ? AND r.min_lng <= ?
+              AND i.latitude BETWEEN ? AND ? AND i.longitude BETWEEN ? AND ?
+        '''
+        params = [south, north, west, east, south, north, west, east]
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        results = self.db.fan_out(lambda shard: [self.to_dict(row) for row in shard.query(query, params)])
+        return self._merge(results, limit)
+
+    def find_nearest(self, lat, lng, k=10):
+        """Retrieves the k institutions nearest to a point, closest first, with distance_km."""
+        return find_nearest(self.find_in_bbox, lat, lng, k, self.MAX_SEARCH_RADIUS_KM)
+
+    def distance_matrix(self, origins, k=None, type=None, max_cells=DEFAULT_MAX_CELLS):
+        """Distances from many (lat, lng) origins to every institution, optionally of one type.
+
+        Returns (targets, rows). rows yields one entry per origin: with k, the
+        k nearest institutions with distance_km, closest first; without k, the
+        distance to each target in `targets` order.
+        """
+        query = "SELECT * FROM institutions WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+        params = []
+        if type:
+            query += " AND type = ?"
+            params.append(type)
+        results = self.db.fan_out(lambda shard: [self.to_dict(row) for row in shard.query(query + " ORDER BY id", params)])
+        targets = self._merge(results)
+
+        def rows():
+            for result in distance_rows(origins, targets, k, max_cells):
+                if k:
+                    yield [dict(targets[i], distance_km=round(d, 3)) for i, d in result]
+                else:
+                    yield [round(d, 3) for d in result]
+
+        return targets, rows()
+
+    @staticmethod
+    def _match_expression(text):
+        """Turns free user input into a safe FTS5 query: every word is a quoted prefix term."""
+        words = re.findall(r'\w+', text or '')
+        return ' '.join(f'"{word}"*' for word in words)
+
+    @staticmethod
+    def _highlight(text):
+        """HTML-escapes FTS output and turns the match markers into <mark> tags."""
+        if text is None:
+            return None
+        return html.escape(text).replace(_HL_START, '<mark>').replace(_HL_END, '</mark>')
+
+    def search(self, text, limit=20):
+        """Full-text search over names, courses and details, ranked by BM25.
+
+        Each shard ranks against its own index statistics, so scores from
+        different shards are close but not strictly comparable.
+        """
+        match = self._match_expression(text)
+        if not match:
+            return []
+        results = [inst for rows in self.db.fan_out(lambda shard: self._search_shard(shard, match, limit)) for inst in rows]
+        if len(self.db.shards()) > 1:
+            results.sort(key=lambda inst: inst["score"])
+        return results[:limit]
+
+    def _search_shard(self, shard, match, limit):
+        # Name matches weigh the most, then courses, then details.
+        query = f'''
+            SELECT i.*,
+                   bm25(institutions_fts, 10.0, 4.0, 1.0) AS score,
+                   highlight(institutions_fts, 0, '{_HL_START}', '{_HL_END}') AS name_highlight,
+                   snippet(institutions_fts, -1, '{_HL_START}', '{_HL_END}', '…', 12) AS snippet
+            FROM institutions_fts
+            JOIN institutions i ON i.id = institutions_fts.rowid
+            WHERE institutions_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+        '''
+        results = []
+        for row in shard.query(query, (match, limit)):
+            inst = self.to_dict(row)
+            inst["score"] = round(row['score'], 4)
+            inst["name_highlight"] = self._highlight(row['name_highlight'])
+            inst["snippet"] = self._highlight(row['snippet'])
+            results.append(inst)
+        return results
+
+    @staticmethod
+    def _shard_version(shard):
+        row = shard.query("SELECT value FROM sync_state WHERE name = 'catalog_version'", one=True)
+        return row['value'] if row else 0
+
+    @staticmethod
+    def _format_cursor(versions):
+        """A plain number with one shard, else 'main:27,benguela:3'."""
+        if list(versions) == ["main"]:
+            return versions["main"]
+        return ','.join(f"{name}:{version}" for name, version in versions.items())
+
+    @staticmethod
+    def _parse_cursor(since):
+        """Reads a cursor from _format_cursor (numbers are the main shard's version). None if malformed."""
+        try:
+            return {"main": max(0, int(since))}
+        except (TypeError, ValueError):
+            pass
+        versions = {}
+        for part in str(since).split(','):
+            name, _, version = part.partition(':')
+            try:
+                versions[name] = max(0, int(version))
+            except ValueError:
+                return None
+        return versions
+
+    def catalog_version(self):
+        """The version of the latest insert, update or delete (a per-shard cursor when sharded)."""
+        shards = self.db.shards()
+        versions = self.db.fan_out(self._shard_version)
+        return self._format_cursor({self.db.shard_name(shard): version for shard, version in zip(shards, versions)})
+
+    def changes_since(self, since=0, limit=1000):
+        """Inserts/updates and deletions with version > since, oldest first, at most `limit` of them (per shard).
+
+        When has_more is set, ask again with since=version. reset means the
+        client's version is unknown here (e.g. a restored database) and it
+        should drop its copy and sync from 0.
+        """
+        cursor = self._parse_cursor(since)
+        if cursor is None:
+            return {"version": self.catalog_version(), "changes": [], "deleted": [], "has_more": False, "reset": True}
+
+        shards = self.db.shards()
+        names = [self.db.shard_name(shard) for shard in shards]
+        pages = self.db.fan_out(lambda shard: self._shard_changes(shard, cursor.get(self.db.shard_name(shard), 0), limit))
+        if any(page["reset"] for page in pages):
+            versions = self.db.fan_out(self._shard_version)
+            return {"version": self._format_cursor(dict(zip(names, versions))), "changes": [], "deleted": [], "has_more": False, "reset": True}
+        return {
+            "version": self._format_cursor({name: page["version"] for name, page in zip(names, pages)}),
+            "changes": [item for page in pages for item in page["changes"]],
+            "deleted": [item for page in pages for item in page["deleted"]],
+            "has_more": any(page["has_more"] for page in pages),
+            "reset": False
+        }
+
+    def _shard_changes(self, shard, since, limit):
+        current = self._shard_version(shard)
+        if since > current:
+            return {"version": current, "changes": [], "deleted": [], "has_more": False, "reset": True}
+
+        rows = shard.query("SELECT * FROM institutions WHERE version > ? ORDER BY version LIMIT ?", (since, limit + 1))
+        events = [(row['version'], dict(self.to_dict(row), version=row['version'])) for row in rows]
+        if since > 0:
+            # A fresh client has nothing to delete
+            tombstones = shard.query("SELECT id, version FROM institution_tombstones WHERE version > ? ORDER BY version LIMIT ?", (since, limit + 1))
+            events += [(row['version'], row['id']) for row in tombstones]
+        events.sort(key=lambda event: event[0])
+
+        has_more = len(events) > limit
+        events = events[:limit]
+        return {
+            "version": events[-1][0] if has_more else current,
+            "changes": [item for _, item in events if isinstance(item, dict)],
+            "deleted": [item for _, item in events if not isinstance(item, dict)],
+            "has_more": has_more,
+            "reset": False
+        }
+
+    def delete(self):
+        """Deletes the institution (leaving a tombstone for delta sync)."""
+        def delete_from(shard):
+            row = shard.query("SELECT * FROM institutions WHERE id = ?", (self.id,), one=True)
+            if row is not None:
+                shard.execute("DELETE FROM institutions WHERE id = ?", (self.id,))
+            return row
+
+        rows = [row for row in self.db.fan_out(delete_from) if row is not None]
+        if not rows:
+            return False
+        catalog_cache.invalidate([dict(self.to_dict(rows[0]), deleted=True)])
+        return True
 
     def create(self):
-        """Creates a new institution."""
+        """Creates a new institution (and its course links, in the same transaction)."""
         query = '''
             INSERT INTO institutions (name, type, latitude, longitude, details, website, ranking, courses)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         '''
-        self.id = self.db.execute(query, (self.name, self.type, self.latitude, self.longitude, self.details, self.website, self.ranking, self.courses))
+        # The unique index only covers one shard: a name taken in any other shard is a conflict too
+        name_taken = "SELECT 1 FROM institutions WHERE name = ?"
+        if any(self.db.fan_out(lambda shard: shard.query(name_taken, (self.name,), one=True) is not None)):
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: institutions.name")
+
+        shard = self.db.shard_for(latitude=self.latitude, longitude=self.longitude)
+        with shard.transaction() as conn:
+            self.id = conn.execute(query, (self.name, self.type, self.latitude, self.longitude, self.details, self.website, self.ranking, self.courses)).lastrowid
+            link_courses(conn, [(self.id, self.courses)])
+        catalog_cache.invalidate([self.to_dict(vars(self))])
         return self.id
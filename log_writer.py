@@ -0,0 +1,143 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class _Flush:
+    """Queue marker asking the writer thread to write what it has and signal back."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+_STOP = object()
+
+class LoginLogWriter:
+    """Buffers login events and writes them to login_logs in batches.
+
+    Requests only enqueue (user_id, ip, timestamp); a background thread drains
+    the bounded queue and inserts each batch with executemany in a single
+    transaction. When the queue is full, log() waits up to put_timeout and
+    then drops the event instead of stalling the request. on_written, if
+    given, is called with each batch once it is committed.
+    """
+
+    INSERT = "INSERT INTO login_logs (user_id, ip_address, timestamp) VALUES (?, ?, ?)"
+
+    def __init__(self, db, flush_interval=0.5, batch_size=500, max_queue=10000, put_timeout=0.05, on_written=None):
+        self.db = db
+        self.on_written = on_written
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+
+    def _ensure_started(self):
+        """Starts the writer thread lazily, once per process (safe across forks)."""
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            if self._pid is not None:
+                # Forked child: the parent's thread and queued events do not belong to us.
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+            else:
+                atexit.register(self.close)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="login-log-writer", daemon=True)
+            self._thread.start()
+
+    def log(self, user_id, ip_address):
+        """Enqueues a login event. Returns False if it had to be dropped."""
+        if self._closed:
+            return False
+        self._ensure_started()
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())  # same format as CURRENT_TIMESTAMP
+        try:
+            self._queue.put((user_id, ip_address, timestamp), timeout=self.put_timeout)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("enqueued")
+        return True
+
+    def flush(self, timeout=5.0):
+        """Blocks until every event enqueued so far has been written."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def close(self, timeout=5.0):
+        """Flushes pending events and stops the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        return stats
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch full, interval elapsed, flush requested or stopping
+            if batch:
+                self._write(batch)
+                batch = []
+            deadline = None
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is _STOP:
+                return
+
+    def _write(self, batch):
+        try:
+            with self.db.transaction() as conn:
+                conn.executemany(self.INSERT, batch)
+        except Exception:
+            logger.exception("Error writing login logs")
+            self._count("failed_batches")
+            self._count("dropped", len(batch))
+            return
+        self._count("batches")
+        self._count("written", len(batch))
+        if self.on_written is not None:
+            try:
+                self.on_written(batch)
+            except Exception:
+                logger.exception("Error in login log callback")
@@ -0,0 +1,171 @@
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus style), in seconds."""
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self):
+        """Yields (upper bound label, cumulative count), ending with +Inf."""
+        total = 0
+        for bound, n in zip(self.buckets + (None,), self.counts):
+            total += n
+            yield ('+Inf' if bound is None else repr(bound)), total
+
+
+class Metrics:
+    """In-process request and SQL instrumentation rendered as Prometheus text.
+
+    Recording is a couple of perf_counter() calls and one locked dict update,
+    so it stays on in production. SQL is labelled by its normalized statement
+    text; once max_statements distinct statements have been seen, new ones
+    are folded into a single 'other' series to bound label cardinality.
+    """
+
+    def __init__(self, enabled=True, slow_query_seconds=0.1, max_statements=500, slow_log_size=100):
+        self.enabled = enabled
+        self.slow_query_seconds = slow_query_seconds
+        self.max_statements = max_statements
+
+        self._lock = threading.Lock()
+        self._requests = {}      # (route, method) -> Histogram
+        self._responses = {}     # (route, method, status) -> count
+        self._queries = {}       # statement -> Histogram
+        self._statements = {}    # raw sql -> normalized label
+        self._query_errors = {}  # statement -> count
+        self._slow = deque(maxlen=slow_log_size)
+        self._collectors = []
+        self.started = time.time()
+
+    # --- Recording ---
+
+    def observe_request(self, route, method, status, seconds):
+        if not self.enabled:
+            return
+        key = (route, method)
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(seconds)
+            status_key = (route, method, status)
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+
+    def statement(self, sql):
+        """Returns the metric label for a SQL string (whitespace-collapsed, memoized)."""
+        label = self._statements.get(sql)
+        if label is None:
+            label = re.sub(r'\s+', ' ', sql).strip()[:200]
+            with self._lock:
+                if len(self._statements) >= self.max_statements:
+                    label = 'other'
+                else:
+                    self._statements[sql] = label
+        return label
+
+    def observe_query(self, sql, seconds, failed=False):
+        if not self.enabled:
+            return
+        label = self.statement(sql)
+        with self._lock:
+            histogram = self._queries.get(label)
+            if histogram is None:
+                histogram = self._queries[label] = Histogram()
+            histogram.observe(seconds)
+            if failed:
+                self._query_errors[label] = self._query_errors.get(label, 0) + 1
+            if seconds >= self.slow_query_seconds:
+                self._slow.append({"statement": label, "seconds": round(seconds, 6), "at": time.time()})
+        if seconds >= self.slow_query_seconds:
+            logger.warning("Slow query (%.1f ms): %s", seconds * 1000, label)
+
+    def add_collector(self, name, kind, help_text, collect, label='name'):
+        """Registers a value read at scrape time; collect() returns a number or {label_value: number}."""
+        self._collectors.append((name, kind, help_text, collect, label))
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    # --- Exposition ---
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            requests = {k: (list(h.cumulative()), h.sum, h.count) for k, h in self._requests.items()}
+            responses = dict(self._responses)
+            queries = {k: (list(h.cumulative()), h.sum, h.count) for k, h in self._queries.items()}
+            query_errors = dict(self._query_errors)
+
+        lines = []
+        self._histogram_lines(lines, 'http_request_duration_seconds', 'Request latency by route.',
+                              {f'route="{_escape(r)}",method="{m}"': v for (r, m), v in sorted(requests.items())})
+        lines.append('# HELP http_responses_total Responses by route and status code.')
+        lines.append('# TYPE http_responses_total counter')
+        for (route, method, status), n in sorted(responses.items()):
+            lines.append(f'http_responses_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {n}')
+
+        self._histogram_lines(lines, 'db_query_duration_seconds', 'SQL statement latency.',
+                              {f'statement="{_escape(s)}"': v for s, v in sorted(queries.items())})
+        lines.append('# HELP db_query_errors_total Failed SQL statements.')
+        lines.append('# TYPE db_query_errors_total counter')
+        for statement, n in sorted(query_errors.items()):
+            lines.append(f'db_query_errors_total{{statement="{_escape(statement)}"}} {n}')
+
+        for name, kind, help_text, collect, label_name in self._collectors:
+            try:
+                value = collect()
+            except Exception as e:
+                logger.exception("Error collecting metric %s", name)
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if isinstance(value, dict):
+                for label, v in sorted(value.items()):
+                    lines.append(f'{name}{{{label_name}="{_escape(str(label))}"}} {v}')
+            else:
+                lines.append(f'{name} {value}')
+
+        lines.append('# HELP process_start_time_seconds Start time of the process since the epoch.')
+        lines.append('# TYPE process_start_time_seconds gauge')
+        lines.append(f'process_start_time_seconds {self.started}')
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(lines, name, help_text, series):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, (buckets, total, count) in series.items():
+            for bound, n in buckets:
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'{name}_sum{{{labels}}} {total}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics(
+    enabled=os.environ.get('METRICS_ENABLED', '1') != '0',
+    slow_query_seconds=float(os.environ.get('SLOW_QUERY_MS', 100)) / 1000.0,
+)
@@ -0,0 +1,360 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Schema history. Each migration runs once, in order, and the database records
+# the last applied number in PRAGMA user_version. Append new migrations at the
+# end and never edit one that has shipped. The early ones use IF NOT EXISTS so
+# databases created before user_version was tracked (version 0) upgrade cleanly.
+
+def _create_base_tables(cursor):
+    """Creates the users, institutions and login_logs tables."""
+    # Users Table with Email
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Institutions Table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS institutions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            type TEXT NOT NULL, -- University, Faculty, Institute
+            latitude REAL,
+            longitude REAL,
+            details TEXT,
+            website TEXT,
+            ranking TEXT,
+            courses TEXT
+        )
+    ''')
+
+    # Login Logs Table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS login_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            FOREIGN KEY(user_id) REFERENCES users(id)
+        )
+    ''')
+
+def _create_spatial_index(cursor):
+    """Creates the R*Tree over institution coordinates and the triggers keeping it in sync."""
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS institutions_rtree USING rtree(
+            id, min_lat, max_lat, min_lng, max_lng
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_rtree_insert AFTER INSERT ON institutions
+        WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+        BEGIN
+            INSERT INTO institutions_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_rtree_update AFTER UPDATE OF latitude, longitude ON institutions
+        BEGIN
+            DELETE FROM institutions_rtree WHERE id = OLD.id;
+            INSERT INTO institutions_rtree
+                SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_rtree_delete AFTER DELETE ON institutions
+        BEGIN
+            DELETE FROM institutions_rtree WHERE id = OLD.id;
+        END
+    ''')
+
+    # Backfill rows that existed before the index did.
+    if cursor.execute("SELECT 1 FROM institutions_rtree LIMIT 1").fetchone() is None:
+        cursor.execute('''
+            INSERT INTO institutions_rtree
+                SELECT id, latitude, latitude, longitude, longitude FROM institutions
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''')
+
+def _create_search_index(cursor):
+    """Creates the FTS5 index over institution names, courses and details."""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'institutions_fts'").fetchone()
+
+    # External-content table: the text lives only in `institutions`.
+    # remove_diacritics folds accents, so "ciencias" matches "Ciências".
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS institutions_fts USING fts5(
+            name, courses, details,
+            content='institutions', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_fts_insert AFTER INSERT ON institutions
+        BEGIN
+            INSERT INTO institutions_fts(rowid, name, courses, details)
+            VALUES (NEW.id, NEW.name, NEW.courses, NEW.details);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_fts_update AFTER UPDATE OF name, courses, details ON institutions
+        BEGIN
+            INSERT INTO institutions_fts(institutions_fts, rowid, name, courses, details)
+            VALUES ('delete', OLD.id, OLD.name, OLD.courses, OLD.details);
+            INSERT INTO institutions_fts(rowid, name, courses, details)
+            VALUES (NEW.id, NEW.name, NEW.courses, NEW.details);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institutions_fts_delete AFTER DELETE ON institutions
+        BEGIN
+            INSERT INTO institutions_fts(institutions_fts, rowid, name, courses, details)
+            VALUES ('delete', OLD.id, OLD.name, OLD.courses, OLD.details);
+        END
+    ''')
+
+    if not exists:
+        cursor.execute("INSERT INTO institutions_fts(institutions_fts) VALUES ('rebuild')")
+
+def _create_stats_tables(cursor):
+    """Creates trigger-maintained counters and visit rollups for the admin dashboard."""
+    exists = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'stats_counters'").fetchone()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visits_hourly (
+            hour TEXT PRIMARY KEY, -- 'YYYY-MM-DD HH:00' (UTC)
+            count INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visits_daily (
+            day TEXT PRIMARY KEY, -- 'YYYY-MM-DD' (UTC)
+            count INTEGER NOT NULL
+        )
+    ''')
+
+    # Covering index: the recent-logs query reads only the index, newest first.
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_login_logs_recent ON login_logs(timestamp, user_id, ip_address)")
+
+    # Visits only ever count up: pruning old logs must not rewrite history.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stats_login_logs_insert AFTER INSERT ON login_logs
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'visits';
+            INSERT INTO visits_hourly(hour, count) VALUES (strftime('%Y-%m-%d %H:00', NEW.timestamp), 1)
+                ON CONFLICT(hour) DO UPDATE SET count = count + 1;
+            INSERT INTO visits_daily(day, count) VALUES (date(NEW.timestamp), 1)
+                ON CONFLICT(day) DO UPDATE SET count = count + 1;
+        END
+    ''')
+    for table in ('users', 'institutions'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS stats_{table}_insert AFTER INSERT ON {table}
+            BEGIN
+                UPDATE stats_counters SET value = value + 1 WHERE name = '{table}';
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS stats_{table}_delete AFTER DELETE ON {table}
+            BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE name = '{table}';
+            END
+        ''')
+
+    if not exists:
+        # One-off backfill from existing history
+        cursor.execute('''
+            INSERT INTO stats_counters(name, value)
+            SELECT 'visits', COUNT(*) FROM login_logs
+            UNION ALL SELECT 'users', COUNT(*) FROM users
+            UNION ALL SELECT 'institutions', COUNT(*) FROM institutions
+        ''')
+        cursor.execute('''
+            INSERT INTO visits_hourly(hour, count)
+            SELECT strftime('%Y-%m-%d %H:00', timestamp), COUNT(*) FROM login_logs GROUP BY 1
+        ''')
+        cursor.execute('''
+            INSERT INTO visits_daily(day, count)
+            SELECT date(timestamp), COUNT(*) FROM login_logs GROUP BY 1
+        ''')
+
+def _create_course_tables(cursor):
+    """Creates the normalized course catalog (filled by courses.link_courses)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS courses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            slug TEXT UNIQUE NOT NULL, -- canonical key, e.g. 'engenharia-informatica'
+            name TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS institution_courses (
+            institution_id INTEGER NOT NULL REFERENCES institutions(id),
+            course_id INTEGER NOT NULL REFERENCES courses(id),
+            PRIMARY KEY (institution_id, course_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_institution_courses_course ON institution_courses(course_id)")
+
+def _create_retention_tables(cursor):
+    """Creates the per-user daily rollup that outlives archived login_logs rows."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS visits_daily_users (
+            day TEXT NOT NULL, -- 'YYYY-MM-DD' (UTC)
+            user_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (day, user_id)
+        ) WITHOUT ROWID
+    ''')
+
+def _create_institution_name_index(cursor):
+    """Makes institution names unique, the key of bulk-import upserts.
+
+    Existing duplicates keep their oldest row's name; the others get their id
+    appended ("Name (12)") so nothing is lost and an admin can merge them.
+    """
+    duplicates = cursor.execute('''
+        SELECT id, name FROM institutions
+        WHERE id NOT IN (SELECT MIN(id) FROM institutions GROUP BY name)
+    ''').fetchall()
+    for inst_id, name in duplicates:
+        logger.warning("Renaming duplicate institution %d %r to %r", inst_id, name, f"{name} ({inst_id})")
+    cursor.executemany("UPDATE institutions SET name = ? WHERE id = ?", [(f"{name} ({inst_id})", inst_id) for inst_id, name in duplicates])
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_institutions_name ON institutions(name)")
+
+def _create_institution_type_index(cursor):
+    """Indexes institutions by type for the type filters of distances and facets."""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_institutions_type ON institutions(type)")
+
+def _create_sync_tracking(cursor):
+    """Adds per-row change versions and deletion tombstones for delta sync."""
+    cursor.execute("ALTER TABLE institutions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("ALTER TABLE institutions ADD COLUMN updated_at DATETIME")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS institution_tombstones (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            deleted_at DATETIME
+        )
+    ''')
+
+    # Existing rows get distinct versions, so pages cut by version never split one
+    cursor.execute("UPDATE institutions SET version = id, updated_at = CURRENT_TIMESTAMP")
+    cursor.execute("INSERT INTO sync_state(name, value) SELECT 'catalog_version', COALESCE(MAX(id), 0) FROM institutions")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_institutions_version ON institutions(version)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_institution_tombstones_version ON institution_tombstones(version)")
+
+    # Every insert, real update and delete takes the next catalog version
+    bump = "UPDATE sync_state SET value = value + 1 WHERE name = 'catalog_version';"
+    current = "(SELECT value FROM sync_state WHERE name = 'catalog_version')"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS institutions_sync_insert AFTER INSERT ON institutions
+        BEGIN
+            {bump}
+            UPDATE institutions SET version = {current}, updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    ''')
+    # Re-imports upsert unchanged rows: only bump when a value actually differs
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS institutions_sync_update
+        AFTER UPDATE OF name, type, latitude, longitude, details, website, ranking, courses ON institutions
+        WHEN OLD.name IS NOT NEW.name OR OLD.type IS NOT NEW.type
+          OR OLD.latitude IS NOT NEW.latitude OR OLD.longitude IS NOT NEW.longitude
+          OR OLD.details IS NOT NEW.details OR OLD.website IS NOT NEW.website
+          OR OLD.ranking IS NOT NEW.ranking OR OLD.courses IS NOT NEW.courses
+        BEGIN
+            {bump}
+            UPDATE institutions SET version = {current}, updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS institutions_sync_delete AFTER DELETE ON institutions
+        BEGIN
+            {bump}
+            INSERT INTO institution_tombstones(id, version, deleted_at) VALUES (OLD.id, {current}, CURRENT_TIMESTAMP)
+                ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted_at = excluded.deleted_at;
+        END
+    ''')
+
+def _link_courses_on_write(cursor):
+    """Relinks every institution's courses; from here on the links are written with the institutions."""
+    from src.courses import link_courses
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS institution_courses_delete AFTER DELETE ON institutions
+        BEGIN
+            DELETE FROM institution_courses WHERE institution_id = OLD.id;
+        END
+    ''')
+    cursor.execute("DELETE FROM institution_courses")
+    link_courses(cursor, cursor.execute("SELECT id, courses FROM institutions").fetchall())
+
+
+# (version, description, migration); append only
+MIGRATIONS = (
+    (1, "users, institutions and login_logs", _create_base_tables),
+    (2, "R*Tree spatial index", _create_spatial_index),
+    (3, "FTS5 search index", _create_search_index),
+    (4, "stats counters and visit rollups", _create_stats_tables),
+    (5, "normalized courses", _create_course_tables),
+    (6, "per-user daily visit rollup", _create_retention_tables),
+    (7, "unique institution names", _create_institution_name_index),
+    (8, "institution type index", _create_institution_type_index),
+    (9, "institution versions and tombstones for delta sync", _create_sync_tracking),
+    (10, "course links written with the institutions", _link_courses_on_write),
+)
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Applies pending migrations in one write transaction. Returns the versions applied.
+
+    An up-to-date database costs a single PRAGMA read. Otherwise BEGIN
+    IMMEDIATE takes the write lock, so when several workers start at once one
+    migrates while the others wait (busy_timeout), re-read the version and
+    find nothing left to do.
+    """
+    if schema_version(conn) >= LATEST_VERSION:
+        return []
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)
+        cursor = conn.cursor()
+        applied = []
+        for version, description, migration in MIGRATIONS:
+            if version > current:
+                start = time.perf_counter()
+                migration(cursor)
+                applied.append(version)
+                logger.info("Applied migration %d (%s) in %.1f ms", version, description, (time.perf_counter() - start) * 1000)
+        conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return applied
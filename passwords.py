@@ -0,0 +1,233 @@
+import base64
+import hashlib
+import hmac
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+import time
+
+SCHEME = "scrypt"
+
+def _derive(password, salt, n, r, p, dklen):
+    """Runs the KDF (in a worker process)."""
+    maxmem = 128 * r * (n + p + 2) + 1024 * 1024
+    return hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=maxmem, dklen=dklen)
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+# Directory to run `python -m <this module>` from
+_IMPORT_ROOT = os.path.abspath(__file__)
+for _ in range(__name__.count('.') + 1):
+    _IMPORT_ROOT = os.path.dirname(_IMPORT_ROOT)
+
+class _Worker:
+    """One hashing process, started as `python -m src.passwords`.
+
+    A fresh interpreter that imports this module alone: never a fork of the
+    threaded server, and never a re-import of the server's __main__ (which
+    multiprocessing's spawn/forkserver workers would do). Requests and
+    results are pickled over its stdin/stdout.
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, '-m', __name__], cwd=_IMPORT_ROOT,
+                                        stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def derive(self, *args):
+        """Returns (True, key), or (False, exception) when the KDF itself failed."""
+        pickle.dump(args, self.process.stdin)
+        self.process.stdin.flush()
+        return pickle.load(self.process.stdout)
+
+    def close(self):
+        try:
+            self.process.stdin.close()  # the worker exits at end of input
+        except OSError:
+            pass
+        self.process.stdout.close()
+
+class PasswordHasher:
+    """Salted scrypt hashing run in a bounded process pool.
+
+    Hashes are stored as 'scrypt$n$r$p$salt$hash'. Anything else in the
+    password column is treated as a legacy plaintext value: it still verifies,
+    but is reported as needing a rehash so callers can upgrade it.
+    """
+
+    LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, n=2 ** 14, r=8, p=1, dklen=32, salt_bytes=16, max_workers=None, max_pending=64):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.dklen = dklen
+        self.salt_bytes = salt_bytes
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._idle = queue.LifoQueue()
+        self._started = 0
+        self._pid = None
+        self._stats = {"hashes": 0, "pending": 0, "max_pending_seen": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+        self._buckets = [0] * (len(self.LATENCY_BUCKETS) + 1)
+
+    def _checkout(self):
+        """Borrows an idle worker, starting one (up to max_workers) or waiting for one."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Started lazily, once per process: a forked child must not share its parent's pipes
+                self._idle, self._started, self._pid = queue.LifoQueue(), 0, os.getpid()
+            idle = self._idle
+            reserve = idle.empty() and self._started < self.max_workers
+            if reserve:
+                self._started += 1
+        worker = None if reserve else idle.get()  # None is a free slot (new, or left by a broken worker)
+        if worker is None:
+            try:
+                worker = _Worker()
+            except BaseException:
+                idle.put(None)
+                raise
+            worker.idle = idle
+        return worker
+
+    def _checkin(self, worker, broken):
+        """Returns a worker to its pool; a broken one (or one from before shutdown) is stopped."""
+        with self._lock:
+            current = worker.idle is self._idle
+        if broken:
+            worker.process.kill()
+        if broken or not current:
+            worker.close()
+        if current:
+            worker.idle.put(None if broken else worker)
+
+    def _run_kdf(self, password, salt, n, r, p, dklen):
+        """Runs the KDF in the pool, blocking while max_pending jobs are already queued."""
+        self._slots.acquire()
+        with self._lock:
+            self._stats["pending"] += 1
+            self._stats["max_pending_seen"] = max(self._stats["max_pending_seen"], self._stats["pending"])
+        start = time.perf_counter()
+        try:
+            for attempt in range(2):
+                worker = self._checkout()
+                try:
+                    ok, key = worker.derive(password, salt, n, r, p, dklen)
+                except (OSError, EOFError, pickle.UnpicklingError):
+                    # The process died (killed, out of memory...): replace it and try once more
+                    self._checkin(worker, broken=True)
+                    if attempt:
+                        raise
+                    continue
+                except BaseException:
+                    self._checkin(worker, broken=True)  # interrupted mid-request: its reply is unread
+                    raise
+                self._checkin(worker, broken=False)
+                if not ok:
+                    raise key
+                return key
+        finally:
+            elapsed = time.perf_counter() - start
+            self._slots.release()
+            self._record(elapsed)
+
+    def _record(self, elapsed):
+        with self._lock:
+            self._stats["pending"] -= 1
+            self._stats["hashes"] += 1
+            self._stats["total_seconds"] += elapsed
+            self._stats["max_seconds"] = max(self._stats["max_seconds"], elapsed)
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if elapsed <= bound:
+                    self._buckets[i] += 1
+                    break
+            else:
+                self._buckets[-1] += 1
+
+    def hash(self, password):
+        """Returns an encoded salted hash of password."""
+        salt = os.urandom(self.salt_bytes)
+        key = self._run_kdf(password, salt, self.n, self.r, self.p, self.dklen)
+        return f"{SCHEME}${self.n}${self.r}${self.p}${_b64(salt)}${_b64(key)}"
+
+    def verify(self, stored, password):
+        """Checks password against a stored value. Returns (matches, needs_rehash)."""
+        if stored is None or password is None:
+            return False, False
+
+        parts = stored.split('$')
+        if len(parts) != 6 or parts[0] != SCHEME:
+            # Legacy plaintext row
+            return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8')), True
+
+        try:
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            salt, expected = _unb64(parts[4]), _unb64(parts[5])
+        except ValueError:
+            return False, False
+        key = self._run_kdf(password, salt, n, r, p, len(expected))
+        matches = hmac.compare_digest(key, expected)
+        return matches, matches and (n, r, p) != (self.n, self.r, self.p)
+
+    def stats(self):
+        """Returns queue depth and hash latency metrics."""
+        with self._lock:
+            stats = dict(self._stats)
+            buckets = list(self._buckets)
+        stats["avg_seconds"] = stats["total_seconds"] / stats["hashes"] if stats["hashes"] else 0.0
+        stats["latency_buckets"] = dict(zip([str(b) for b in self.LATENCY_BUCKETS] + ["+Inf"], buckets))
+        stats["max_workers"] = self.max_workers
+        stats["max_pending"] = self.max_pending
+        return stats
+
+    def shutdown(self):
+        """Stops the idle workers; busy ones are stopped when they are checked in."""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            idle, self._idle, self._started = self._idle, queue.LifoQueue(), 0
+        while True:
+            try:
+                worker = idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.close()
+
+
+def _serve():
+    """Worker loop: derives one key per pickled request on stdin until stdin closes."""
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    while True:
+        try:
+            args = pickle.load(stdin)
+        except EOFError:
+            return
+        try:
+            result = True, _derive(*args)
+        except Exception as e:
+            result = False, e
+        pickle.dump(result, stdout)
+        stdout.flush()
+
+
+password_hasher = PasswordHasher(
+    n=int(os.environ.get('SCRYPT_N', 2 ** 14)),
+    r=int(os.environ.get('SCRYPT_R', 8)),
+    p=int(os.environ.get('SCRYPT_P', 1)),
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64)),
+)
+
+if __name__ == '__main__':
+    _serve()
@@ -0,0 +1,160 @@
+import argparse
+import datetime
+import gzip
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = 'login_logs_'
+
+def _month_start(day):
+    return day.replace(day=1)
+
+def _next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+class LoginLogRetention:
+    """Keeps login_logs small: partition, roll up, then archive old visits.
+
+    run() performs two idempotent steps:
+      1. rows of closed months move from login_logs into a per-month table
+         (login_logs_YYYYMM), after their days are rolled up into
+         visits_daily_users, so the hot table only holds the current month;
+      2. partitions whose whole month is older than retention_days are
+         written to archive_dir as gzip-compressed NDJSON and dropped.
+    Every visit is therefore either rolled up or still in login_logs, which
+    is what Stats.visits_between relies on.
+
+    The visits counters and visits_daily/visits_hourly are maintained by
+    insert triggers on login_logs and never shrink when rows move or go.
+    """
+
+    def __init__(self, db, archive_dir='archive', retention_days=90):
+        self.db = db
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def run(self, now=None):
+        """Runs one maintenance pass. Returns a report of what moved."""
+        today = (now or datetime.datetime.utcnow()).date()
+        current_month = _month_start(today)
+        report = {"partitioned": {}, "archived": {}}
+        with self._lock:
+            for month in self._closed_months(current_month):
+                report["partitioned"][month.strftime('%Y-%m')] = self._partition_month(month)
+
+            archive_before = today - datetime.timedelta(days=self.retention_days)
+            for table, month in self.partitions():
+                if _next_month(month) <= archive_before:
+                    report["archived"][month.strftime('%Y-%m')] = self._archive_partition(table, month)
+        return report
+
+    def partitions(self):
+        """Existing monthly partition tables as (table name, first day of month), oldest first."""
+        rows = self.db.query("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name", (PARTITION_PREFIX + '%',))
+        partitions = []
+        for row in rows:
+            match = re.fullmatch(PARTITION_PREFIX + r'(\d{4})(\d{2})', row['name'])
+            if match:
+                partitions.append((row['name'], datetime.date(int(match.group(1)), int(match.group(2)), 1)))
+        return partitions
+
+    def _closed_months(self, current_month):
+        rows = self.db.query(
+            "SELECT DISTINCT substr(timestamp, 1, 7) AS month FROM login_logs WHERE timestamp < ? ORDER BY month",
+            (current_month.isoformat(),),
+        )
+        return [datetime.date(int(row['month'][:4]), int(row['month'][5:7]), 1) for row in rows]
+
+    def _partition_month(self, month):
+        """Rolls up and moves one closed month out of the hot table, in one transaction."""
+        table = f"{PARTITION_PREFIX}{month:%Y%m}"
+        bounds = (month.isoformat(), _next_month(month).isoformat())
+        with self.db.transaction() as conn:
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INTEGER PRIMARY KEY,
+                    user_id INTEGER,
+                    timestamp DATETIME,
+                    ip_address TEXT
+                )
+            ''')
+            conn.execute('''
+                INSERT INTO visits_daily_users(day, user_id, count)
+                SELECT date(timestamp), user_id, COUNT(*) FROM login_logs
+                WHERE timestamp >= ? AND timestamp < ?
+                GROUP BY 1, 2
+                ON CONFLICT(day, user_id) DO UPDATE SET count = count + excluded.count
+            ''', bounds)
+            moved = conn.execute(f'''
+                INSERT OR IGNORE INTO {table} (id, user_id, timestamp, ip_address)
+                SELECT id, user_id, timestamp, ip_address FROM login_logs
+                WHERE timestamp >= ? AND timestamp < ?
+            ''', bounds).rowcount
+            conn.execute("DELETE FROM login_logs WHERE timestamp >= ? AND timestamp < ?", bounds)
+        return moved
+
+    def _archive_partition(self, table, month):
+        """Writes a partition to gzip NDJSON (atomically), then drops it."""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        span = self.db.query(f"SELECT MIN(id) AS first, MAX(id) AS last, COUNT(*) AS n FROM {table}", one=True)
+        if span['n']:
+            # Named by id range: re-running after a crash rewrites the same file instead of duplicating rows
+            path = os.path.join(self.archive_dir, f"login_logs-{month:%Y-%m}-{span['first']}-{span['last']}.ndjson.gz")
+            tmp_path = path + '.tmp'
+            with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=9) as f:
+                for row in self.db.iterate(f"SELECT id, user_id, timestamp, ip_address FROM {table} ORDER BY id"):
+                    f.write(json.dumps(dict(row), separators=(',', ':')) + '\n')
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        with self.db.transaction() as conn:
+            conn.execute(f"DROP TABLE {table}")
+        return span['n']
+
+    def start(self, interval_seconds):
+        """Runs maintenance now and then every interval_seconds on a daemon timer."""
+        def tick():
+            try:
+                logger.info("Login log retention: %s", json.dumps(self.run()))
+            except Exception:
+                logger.exception("Error running login log retention")
+            self._timer = threading.Timer(interval_seconds, tick)
+            self._timer.daemon = True
+            self._timer.start()
+
+        tick()
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+
+def iter_archive(path):
+    """Yields the login rows stored in one archive file."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def main(argv=None):
+    from src.database import Database
+
+    parser = argparse.ArgumentParser(description="Partition, roll up and archive old login logs.")
+    parser.add_argument('--db', default='faculties.db', help="SQLite database file")
+    parser.add_argument('--archive-dir', default='archive')
+    parser.add_argument('--retention-days', type=int, default=90, help="keep raw rows for at least this many days")
+    args = parser.parse_args(argv)
+
+    report = LoginLogRetention(Database(args.db), args.archive_dir, args.retention_days).run()
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
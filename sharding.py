@@ -0,0 +1,291 @@
+"""Per-province sharding of the institutions table.
+
+The main database file keeps everything (users, logins, stats) and the
+institutions of every province not listed in the shard map; course links live
+next to their institution. A shard map
+(shards.json) moves provinces to their own SQLite files, each with the full
+schema, its own write lock and a disjoint range of institution ids:
+
+    {"shards": {"benguela": {"path": "shards/benguela.db",
+                             "provinces": ["benguela"],
+                             "id_base": 1000000000000}}}
+
+login_logs stays in the main file: users have no province, and the visit
+counters, rollups and retention all work on it there.
+
+Move a province (copy, switch the map, then delete from the old shard):
+    python -m src.sharding move benguela shards/benguela.db
+    python -m src.sharding status
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.courses import link_courses
+from src.database import Database
+from src.geo import haversine_km
+from src.text import fold
+
+# Province capitals; coordinates are routed to the nearest one
+PROVINCES = {
+    "bengo": ("Bengo", -8.578, 13.664),
+    "benguela": ("Benguela", -12.578, 13.405),
+    "bie": ("Bié", -12.383, 16.933),
+    "cabinda": ("Cabinda", -5.550, 12.200),
+    "cuando-cubango": ("Cuando Cubango", -14.658, 17.691),
+    "cuanza-norte": ("Cuanza Norte", -9.298, 14.911),
+    "cuanza-sul": ("Cuanza Sul", -11.206, 13.844),
+    "cunene": ("Cunene", -17.067, 15.733),
+    "huambo": ("Huambo", -12.776, 15.739),
+    "huila": ("Huíla", -14.917, 13.492),
+    "luanda": ("Luanda", -8.839, 13.289),
+    "lunda-norte": ("Lunda Norte", -7.380, 20.830),
+    "lunda-sul": ("Lunda Sul", -9.660, 20.390),
+    "malanje": ("Malanje", -9.544, 16.341),
+    "moxico": ("Moxico", -11.783, 19.917),
+    "namibe": ("Namibe", -15.196, 12.152),
+    "uige": ("Uíge", -7.609, 15.056),
+    "zaire": ("Zaire", -6.267, 14.240),
+}
+
+# Spelling variants seen in the data ('Kwanza Sul', 'Kuando Kubango')
+_ALIASES = {"kwanza": "cuanza", "kuando": "cuando", "kubango": "cubango"}
+
+# Each new shard allocates institution ids from its own range
+ID_RANGE = 10 ** 12
+
+def normalize_province(region):
+    """'Kwanza Sul' -> 'cuanza-sul'. None when it is not a known province."""
+    words = [_ALIASES.get(word, word) for word in fold(region).replace('_', ' ').replace('-', ' ').split()]
+    slug = '-'.join(words)
+    return slug if slug in PROVINCES else None
+
+def province_for(latitude, longitude):
+    """The province whose capital is nearest (a coarse but stable stand-in for the borders)."""
+    return min(PROVINCES, key=lambda slug: haversine_km(latitude, longitude, PROVINCES[slug][1], PROVINCES[slug][2]))
+
+def _route_province(region=None, latitude=None, longitude=None):
+    # Coordinates win, so a row always lives where move_province will look for it
+    if latitude is not None and longitude is not None:
+        return province_for(latitude, longitude)
+    return normalize_province(region) if region else None
+
+
+class ShardedDatabase(Database):
+    """A Database (the main file) plus per-province institution shards.
+
+    The shard map is re-read when the file changes (checked at most once per
+    check_interval), so running workers pick up a move without a restart.
+    Reads that span shards run on a small thread pool, one task per shard.
+    """
+
+    def __init__(self, db_file="faculties.db", shard_map="shards.json", check_interval=1.0, **kwargs):
+        super().__init__(db_file, **kwargs)
+        self.shard_map = shard_map
+        self.check_interval = check_interval
+        self._kwargs = kwargs
+        self._map_lock = threading.Lock()
+        self._map_key = None
+        self._next_check = 0.0
+        self._config = {}
+        self._shards = {}       # name -> Database
+        self._by_province = {}  # province -> Database
+        self._executor = None
+        self._load_map()
+
+    # --- Shard map ---
+
+    def _read_map(self):
+        try:
+            with open(self.shard_map, encoding='utf-8') as f:
+                return json.load(f).get("shards", {})
+        except FileNotFoundError:
+            return {}
+
+    def _load_map(self):
+        try:
+            stat = os.stat(self.shard_map)
+            key = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        if key == self._map_key:
+            return
+        config = self._read_map()
+        shards, by_province = {}, {}
+        for name, entry in config.items():
+            # Keep open pools for shards that did not move
+            existing = self._shards.get(name)
+            shard = existing if existing is not None and existing.db_file == entry["path"] else Database(entry["path"], **self._kwargs)
+            shards[name] = shard
+            for province in entry.get("provinces", []):
+                by_province[province] = shard
+        self._config, self._shards, self._by_province, self._map_key = config, shards, by_province, key
+
+    def _refresh(self):
+        if time.monotonic() < self._next_check:
+            return
+        with self._map_lock:
+            self._next_check = time.monotonic() + self.check_interval
+            self._load_map()
+
+    def _save_map(self, config):
+        """Writes the map atomically and applies it to this process."""
+        directory = os.path.dirname(os.path.abspath(self.shard_map))
+        fd, tmp_path = tempfile.mkstemp(prefix='.shards-', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"shards": config}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.shard_map)
+        with self._map_lock:
+            self._load_map()
+
+    # --- Routing ---
+
+    def shards(self):
+        self._refresh()
+        return [self] + list(self._shards.values())
+
+    def shard_for(self, region=None, latitude=None, longitude=None):
+        self._refresh()
+        if not self._by_province:
+            return self
+        return self._by_province.get(_route_province(region, latitude, longitude), self)
+
+    def shard_name(self, shard):
+        if shard is self:
+            return "main"
+        for name, candidate in self._shards.items():
+            if candidate is shard:
+                return name
+        return os.path.splitext(os.path.basename(shard.db_file))[0]  # dropped by a concurrent map reload
+
+    def fan_out(self, fn):
+        shards = self.shards()
+        if len(shards) == 1:
+            return [fn(self)]
+        if self._executor is None:
+            with self._map_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=len(PROVINCES) + 1, thread_name_prefix="shard")
+        return list(self._executor.map(fn, shards))
+
+    def close(self):
+        super().close()
+        for shard in self._shards.values():
+            shard.close()
+
+    # --- Rebalancing ---
+
+    def move_province(self, province, path, settle_seconds=None):
+        """Moves a province's institutions into the shard file at path (the main file moves them back).
+
+        Rows are copied first, then the map is switched, then after the other
+        workers have had time to reload it they are moved for good (copy again
+        to catch writes made meanwhile, then delete from the old shard without
+        leaving delta sync tombstones). Returns the number of rows moved.
+        """
+        slug = normalize_province(province)
+        if slug is None:
+            raise ValueError(f"Unknown province: {province}")
+        settle_seconds = self.check_interval * 2 if settle_seconds is None else settle_seconds
+
+        self._refresh()
+        config = json.loads(json.dumps(self._config))
+        for entry in config.values():
+            if slug in entry.get("provinces", []):
+                entry["provinces"].remove(slug)
+
+        if os.path.abspath(path) == os.path.abspath(self.db_file):
+            target = self
+        else:
+            name = next((n for n, e in config.items() if os.path.abspath(e["path"]) == os.path.abspath(path)), None)
+            if name is None:
+                name = os.path.splitext(os.path.basename(path))[0]
+                if name == "main" or name in config:
+                    raise ValueError(f"Shard name {name} is taken; use another file name")
+                used = [entry.get("id_base", 0) for entry in config.values()]
+                config[name] = {"path": path, "provinces": [], "id_base": (max(used, default=0) // ID_RANGE + 1) * ID_RANGE}
+            config[name]["provinces"].append(slug)
+            target = self._shards.get(name)
+            if target is None or target.db_file != path:
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                target = Database(path, **self._kwargs)
+            _reserve_ids(target, config[name]["id_base"])
+
+        sources = [shard for shard in self.shards() if shard.db_file != target.db_file]
+        for source in sources:
+            _copy_province(source, target, slug)
+        self._save_map(config)
+        time.sleep(settle_seconds)
+        return sum(_copy_province(source, target, slug, delete=True) for source in sources)
+
+    def status(self):
+        """Institution count per shard and province."""
+        report = {}
+        for shard in self.shards():
+            provinces = {}
+            for row in shard.query("SELECT latitude, longitude FROM institutions WHERE latitude IS NOT NULL AND longitude IS NOT NULL"):
+                province = province_for(row['latitude'], row['longitude'])
+                provinces[province] = provinces.get(province, 0) + 1
+            report[self.shard_name(shard)] = {"path": shard.db_file, "institutions": sum(provinces.values()), "provinces": provinces}
+        return report
+
+
+_COLUMNS = "id, name, type, latitude, longitude, details, website, ranking, courses"
+
+def _reserve_ids(shard, id_base):
+    """Makes AUTOINCREMENT hand out ids from id_base up in this shard."""
+    with shard.transaction() as conn:
+        current = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'institutions'").fetchone()
+        if current is None:
+            conn.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('institutions', ?)", (id_base,))
+        elif current[0] < id_base:
+            conn.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = 'institutions'", (id_base,))
+
+def _copy_province(source, target, province, delete=False):
+    """Copies (and with delete, moves) one province's rows from source to target, keeping ids."""
+    rows = [
+        tuple(row) for row in source.query(f"SELECT {_COLUMNS} FROM institutions WHERE latitude IS NOT NULL AND longitude IS NOT NULL")
+        if province_for(row['latitude'], row['longitude']) == province
+    ]
+    if not rows:
+        return 0
+    # An upsert rather than OR REPLACE: replaced rows would skip the delete triggers (FTS, R*Tree, counters)
+    updates = ', '.join(f"{column} = excluded.{column}" for column in _COLUMNS.split(', ')[1:])
+    with target.transaction() as conn:
+        conn.executemany(f"INSERT INTO institutions ({_COLUMNS}) VALUES ({', '.join('?' * 9)}) ON CONFLICT(id) DO UPDATE SET {updates}", rows)
+        link_courses(conn, [(row[0], row[8]) for row in rows])  # the source's links go with its delete trigger
+    if delete:
+        ids = [(row[0],) for row in rows]
+        with source.transaction() as conn:
+            conn.executemany("DELETE FROM institutions WHERE id = ?", ids)
+            # A move is not a deletion: clients pick the rows up from the new shard
+            conn.executemany("DELETE FROM institution_tombstones WHERE id = ?", ids)
+    return len(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and rebalance per-province institution shards.")
+    parser.add_argument('--db', default='faculties.db', help="main SQLite database file")
+    parser.add_argument('--map', default='shards.json', help="shard map file")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('status', help="institutions per shard and province")
+    move = commands.add_parser('move', help="move a province to its own file (or back to the main one)")
+    move.add_argument('province')
+    move.add_argument('path')
+    args = parser.parse_args(argv)
+
+    db = ShardedDatabase(args.db, args.map)
+    if args.command == 'move':
+        moved = db.move_province(args.province, args.path)
+        print(f"Moved {moved} institutions of {args.province} to {args.path}")
+    print(json.dumps(db.status(), indent=2, ensure_ascii=False))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
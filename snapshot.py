@@ -0,0 +1,344 @@
+import array
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from src.catalog_cache import catalog_cache, CatalogEntry, brotli
+from src.models.institution import Institution
+from src.distances import load_numpy
+from src.geo import find_nearest
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'LFLSNAP1'
+FORMAT_VERSION = 2
+
+# Text columns, stored as UTF-8 slices of one blob addressed by an offsets array
+FIELDS = ('name', 'type', 'details', 'website', 'ranking', 'courses')
+
+# Fixed section order after the header; every section starts 8-byte aligned
+SECTIONS = ('ids', 'lat', 'lng', 'offsets', 'nulls', 'strings', 'json', 'gzip', 'br', 'cursor')
+
+# magic, format version, row count, etag, then (offset, length) per section
+HEADER = struct.Struct('<8sIQ32s' + 'QQ' * len(SECTIONS))
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+def write_snapshot(path, institutions, cursor=''):
+    """Writes institutions (dicts in id order) to path atomically. Returns the catalog etag.
+
+    Layout: header, int64 ids, float64 latitudes and longitudes (NaN when
+    missing), uint64 offsets and a null flag per (row, field) into a UTF-8
+    string blob, then the serialized catalog JSON and its gzip/br encodings,
+    and last the catalog version (Institution.catalog_version) it was read at.
+    """
+    ids, lat, lng = array.array('q'), array.array('d'), array.array('d')
+    offsets, nulls, strings = array.array('Q', [0]), bytearray(), bytearray()
+    for inst in institutions:
+        ids.append(inst['id'])
+        lat.append(math.nan if inst['latitude'] is None else inst['latitude'])
+        lng.append(math.nan if inst['longitude'] is None else inst['longitude'])
+        for field in FIELDS:
+            value = inst[field]
+            nulls.append(value is None)
+            if value is not None:
+                strings += str(value).encode('utf-8')
+            offsets.append(len(strings))
+
+    body = json.dumps(institutions, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    sections = [
+        ids.tobytes(), lat.tobytes(), lng.tobytes(), offsets.tobytes(), bytes(nulls), bytes(strings), body,
+        gzip.compress(body, compresslevel=9, mtime=0),
+        brotli.compress(body, quality=11) if brotli is not None else b'',
+        str(cursor).encode('ascii'),
+    ]
+
+    table, position = [], _align(HEADER.size)
+    for data in sections:
+        table += [position, len(data)]
+        position = _align(position + len(data))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(ids), etag.encode('ascii'), *table))
+            for offset, data in zip(table[::2], sections):
+                f.seek(offset)
+                f.write(data)
+            f.truncate(position)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)  # readers see the old or the new file, never a partial one
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return etag
+
+
+class CatalogSnapshot:
+    """Read-only view of a snapshot file through a shared mmap.
+
+    Nothing is copied onto the Python heap until a row is decoded, so every
+    worker mapping the same file shares one page-cache copy of it.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, fmt, self.count, etag, *table = HEADER.unpack_from(self._mm)
+        if magic != MAGIC or fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a catalog snapshot (format {FORMAT_VERSION})")
+        self.etag = etag.decode('ascii')
+
+        view = memoryview(self._mm)
+        self._sections = {
+            name: view[offset:offset + length]
+            for name, offset, length in zip(SECTIONS, table[::2], table[1::2])
+        }
+        self.ids = self._sections['ids'].cast('q')
+        self.lat = self._sections['lat'].cast('d')
+        self.lng = self._sections['lng'].cast('d')
+        self._offsets = self._sections['offsets'].cast('Q')
+        self._nulls = self._sections['nulls']
+        self._strings = self._sections['strings']
+        self.cursor = str(self._sections['cursor'], 'ascii')
+
+    def __len__(self):
+        return self.count
+
+    def row(self, i):
+        """Decodes row i into the API representation (same keys and order as Institution.to_dict)."""
+        fields = {}
+        for f, field in enumerate(FIELDS):
+            k = i * len(FIELDS) + f
+            fields[field] = None if self._nulls[k] else str(self._strings[self._offsets[k]:self._offsets[k + 1]], 'utf-8')
+        lat, lng = self.lat[i], self.lng[i]
+        return {
+            "id": self.ids[i],
+            "name": fields['name'],
+            "type": fields['type'],
+            "latitude": None if math.isnan(lat) else lat,
+            "longitude": None if math.isnan(lng) else lng,
+            "details": fields['details'],
+            "website": fields['website'],
+            "ranking": fields['ranking'],
+            "courses": fields['courses'],
+        }
+
+    def get(self, institution_id):
+        """Looks an institution up by id (binary search over the id column)."""
+        i = bisect.bisect_left(self.ids, institution_id)
+        if i < self.count and self.ids[i] == institution_id:
+            return self.row(i)
+        return None
+
+    def get_many(self, ids):
+        """Institutions by id, in id order (unknown ids are skipped), like Institution.get_many."""
+        return [inst for inst in map(self.get, sorted(set(ids))) if inst is not None]
+
+    def find_in_bbox(self, south, west, north, east, limit=None):
+        """Institutions inside a bounding box (west > east crosses the antimeridian)."""
+        numpy = load_numpy()  # optional; without it the scan is a plain loop
+        if numpy is not None:
+            lat = numpy.frombuffer(self._sections['lat'], dtype='<f8')
+            lng = numpy.frombuffer(self._sections['lng'], dtype='<f8')
+            in_lng = (lng >= west) | (lng <= east) if west > east else (lng >= west) & (lng <= east)
+            hits = numpy.flatnonzero((lat >= south) & (lat <= north) & in_lng)[:limit].tolist()
+        else:
+            hits = []
+            for i in range(self.count):
+                lat, lng = self.lat[i], self.lng[i]
+                in_lng = (lng >= west or lng <= east) if west > east else west <= lng <= east
+                if south <= lat <= north and in_lng:
+                    hits.append(i)
+                    if limit and len(hits) >= limit:
+                        break
+        return [self.row(i) for i in hits]
+
+    def find_nearest(self, lat, lng, k=10):
+        """The k institutions nearest to a point, like Institution.find_nearest but over the mapped columns."""
+        return find_nearest(self.find_in_bbox, lat, lng, k, Institution.MAX_SEARCH_RADIUS_KM)
+
+    def catalog_entry(self):
+        """A CatalogEntry whose bodies are slices of the mapping (no per-worker copy)."""
+        bodies = {None: self._sections['json'], "gzip": self._sections['gzip']}
+        if len(self._sections['br']):
+            bodies["br"] = self._sections['br']
+        return CatalogEntry.prebuilt(self.etag, bodies)
+
+
+class SnapshotStore:
+    """Keeps a catalog snapshot file current and mapped in this process.
+
+    Local catalog changes are written to the file write_delay seconds later,
+    batched, on a timer thread. Every worker stats the file at most once per
+    check_interval and remaps it when another process replaced it; it then
+    reads the changes since the catalog version it last synced to and
+    invalidates its own caches (and derived indexes) for just those rows, so
+    all workers converge on the new version without a restart.
+    """
+
+    def __init__(self, db, path, check_interval=1.0, write_delay=1.0):
+        self.db = db
+        self.path = path
+        self.check_interval = check_interval
+        self.write_delay = write_delay
+        self._lock = threading.Lock()  # mapping, writing and syncing the file
+        self._state_lock = threading.Lock()  # the pending write timer
+        self._timer = None
+        self._changes = 0  # catalog changes made in this process
+        self._written_changes = 0  # how many of them the mapped file is known to hold
+        self._local = threading.local()
+        self._snapshot = None
+        self._seen = None  # catalog version this process's caches are synced to
+        self._next_check = 0.0
+        self._stats = {"writes": 0, "remaps": 0, "bulk_syncs": 0, "last_write_seconds": 0.0}
+        catalog_cache.subscribe(self._on_catalog_change)
+
+    def needs_check(self):
+        """True when the next current() call would stat (or build) the file."""
+        return self._snapshot is None or time.monotonic() >= self._next_check
+
+    def current(self):
+        """Returns the mapped snapshot, picking up a newer file when one was written."""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+        with self._lock:
+            # On first use, a file behind the database may predate offline edits
+            return self._check(write=self._snapshot is None)
+
+    def fresh(self):
+        """The mapped snapshot, or None while a change made in this process is not in it yet.
+
+        Changes made by other workers reach it and this process's caches together, on the remap.
+        """
+        snapshot = self.current()
+        return snapshot if self._written_changes == self._changes else None
+
+    def catalog_entry(self):
+        """The snapshot's CatalogEntry, or None while the database is ahead of the file."""
+        snapshot = self.current()
+        if snapshot.cursor != str(Institution(self.db).catalog_version()):
+            return None
+        return snapshot.catalog_entry()
+
+    def _check(self, write):
+        """Maps the file if it changed, first rewriting it when write is set and it is behind."""
+        self._next_check = time.monotonic() + self.check_interval
+        changes = self._changes
+        old = self._snapshot
+        try:
+            stat = os.stat(self.path)
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            key = None
+        snapshot = old if old is not None and old.key == key else self._open()
+        if snapshot is None or (write and snapshot.cursor != str(Institution(self.db).catalog_version())):
+            self._write()
+            snapshot = CatalogSnapshot(self.path)
+        elif snapshot is not old and old is not None:
+            self._stats["remaps"] += 1
+        self._snapshot = snapshot
+
+        if old is None:
+            self._seen = snapshot.cursor
+        elif snapshot is not old:
+            self._sync(old)
+        if write:
+            # The file now matches the database as of this check
+            self._written_changes = max(self._written_changes, changes)
+        return snapshot
+
+    def _open(self):
+        """Maps the file; None when it is missing, unreadable or in an older format."""
+        try:
+            return CatalogSnapshot(self.path)
+        except (OSError, ValueError, struct.error):
+            return None
+
+    def _sync(self, old):
+        """Invalidates this process's caches for the changes since the version it last synced to.
+
+        Rows that moved or went away are first reported as deleted at their
+        old place (read from the previous snapshot), so tiles and clusters
+        around it are dropped too. Too many changes, or a reset, invalidate
+        everything.
+        """
+        institution = Institution(self.db)
+        delta = institution.changes_since(self._seen)
+        if delta["reset"] or delta["has_more"]:
+            self._seen = institution.catalog_version()
+            self._stats["bulk_syncs"] += 1
+            changed = None
+        else:
+            self._seen = delta["version"]
+            changed = []
+            for inst in delta["changes"]:
+                before = old.get(inst["id"])
+                if before is not None and (before["latitude"], before["longitude"]) != (inst["latitude"], inst["longitude"]):
+                    changed.append(dict(before, deleted=True))
+                changed.append(inst)
+            changed += [dict(old.get(inst_id) or {"id": inst_id}, deleted=True) for inst_id in delta["deleted"]]
+            if not changed:
+                return
+        # These changes are in the file already: don't schedule a write for them
+        self._local.syncing = True
+        try:
+            catalog_cache.invalidate(changed)
+        finally:
+            self._local.syncing = False
+
+    def _write(self):
+        start = time.perf_counter()
+        # The version is read first: rows written meanwhile are synced again later, never missed
+        cursor = Institution(self.db).catalog_version()
+        write_snapshot(self.path, list(Institution(self.db).iter_all()), cursor)
+        self._stats["writes"] += 1
+        self._stats["last_write_seconds"] = round(time.perf_counter() - start, 3)
+
+    def _on_catalog_change(self, version, changed):
+        if getattr(self._local, 'syncing', False):
+            return
+        with self._state_lock:
+            self._changes += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self._flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _flush(self):
+        """Timer thread: writes the changes of the last write_delay seconds in one go."""
+        with self._state_lock:
+            self._timer = None
+        try:
+            with self._lock:
+                self._check(write=True)  # a no-op when another worker already wrote them
+        except Exception:
+            logger.exception("Error writing catalog snapshot")
+
+    def stats(self):
+        stats = dict(self._stats)
+        snapshot = self._snapshot
+        stats["rows"] = len(snapshot) if snapshot is not None else None
+        stats["etag"] = snapshot.etag if snapshot is not None else None
+        stats["version"] = snapshot.cursor if snapshot is not None else None
+        stats["write_pending"] = self._timer is not None
+        return stats
@@ -0,0 +1,66 @@
+class Stats:
+    """Read side of the admin dashboard, backed by trigger-maintained counters and rollups."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def counters(self):
+        """Returns the running totals (visits, users, institutions), summed over the shards."""
+        totals = {}
+        for rows in self.db.fan_out(lambda shard: shard.query("SELECT name, value FROM stats_counters")):
+            for row in rows:
+                totals[row['name']] = totals.get(row['name'], 0) + row['value']
+        return totals
+
+    def recent_logs(self, limit=10):
+        """Returns the latest logins, newest first (served by idx_login_logs_recent)."""
+        query = '''
+            SELECT l.timestamp, u.username, u.email, l.ip_address
+            FROM login_logs l
+            JOIN users u ON l.user_id = u.id
+            ORDER BY l.timestamp DESC
+            LIMIT ?
+        '''
+        return [
+            {"timestamp": row['timestamp'], "username": f"{row['username']} ({row['email']})", "ip": row['ip_address']}
+            for row in self.db.query(query, (limit,))
+        ]
+
+    def visits_by_day(self, days=30):
+        """Returns per-day visit counts for the last `days` days (UTC)."""
+        query = "SELECT day, count FROM visits_daily WHERE day >= date('now', ?) ORDER BY day"
+        return [{"day": row['day'], "count": row['count']} for row in self.db.query(query, (f'-{days - 1} days',))]
+
+    def visits_between(self, start, end):
+        """Visits and unique users per day for start..end (ISO dates, UTC, inclusive).
+
+        Counts come from visits_daily. Unique users come from the per-user
+        rollup for partitioned days plus the hot login_logs rows; every visit
+        is in exactly one of the two, so archived days need no raw rows.
+        """
+        bounds = (start, end)
+        days = {
+            row['day']: {"day": row['day'], "count": row['count'], "users": 0}
+            for row in self.db.query("SELECT day, count FROM visits_daily WHERE day BETWEEN ? AND ? ORDER BY day", (start, end))
+        }
+        pairs = '''
+            SELECT day, user_id FROM visits_daily_users WHERE day BETWEEN ? AND ?
+            UNION
+            SELECT date(timestamp), user_id FROM login_logs WHERE timestamp >= ? AND timestamp < date(?, '+1 day')
+        '''
+        for row in self.db.query(f"SELECT day, COUNT(*) AS users FROM ({pairs}) GROUP BY day", bounds * 2):
+            if row['day'] in days:
+                days[row['day']]["users"] = row['users']
+        total = self.db.query(f"SELECT COUNT(DISTINCT user_id) AS n FROM ({pairs})", bounds * 2, one=True)
+        return {
+            "from": start,
+            "to": end,
+            "total_visits": sum(day["count"] for day in days.values()),
+            "unique_users": total['n'],
+            "days": list(days.values())
+        }
+
+    def visits_by_hour(self, hours=48):
+        """Returns per-hour visit counts for the last `hours` hours (UTC)."""
+        query = "SELECT hour, count FROM visits_hourly WHERE hour >= strftime('%Y-%m-%d %H:00', 'now', ?) ORDER BY hour"
+        return [{"hour": row['hour'], "count": row['count']} for row in self.db.query(query, (f'-{hours - 1} hours',))]
@@ -0,0 +1,12 @@
+import re
+import unicodedata
+
+def fold(text):
+    """Lowercases and strips accents: 'Ciências Sociais' -> 'ciencias sociais'."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return re.sub(r'\s+', ' ', stripped).strip().lower()
+
+def tokens(text):
+    """Accent-folded word tokens of a string."""
+    return re.findall(r'\w+', fold(text))
@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import math
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+from src.catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+# --- Minimal Mapbox Vector Tile (v2.1) protobuf encoder for point layers ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _field_varint(number, value):
+    return _varint(number << 3) + _varint(value)
+
+def _field_bytes(number, data):
+    return _varint((number << 3) | 2) + _varint(len(data)) + data
+
+def _packed(number, values):
+    return _field_bytes(number, b''.join(_varint(v) for v in values))
+
+def encode_point_layer(name, features, extent=4096):
+    """Encodes (id, x, y, properties) features into a single-layer MVT tile."""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded = []
+
+    for feature_id, x, y, properties in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            if value not in value_index:
+                value_index[value] = len(values)
+                values.append(value)
+            tags += (key_index[key], value_index[value])
+
+        # One MoveTo command (id 1, count 1) followed by the zigzag-encoded position
+        geometry = (9, _zigzag(x), _zigzag(y))
+        feature = _field_varint(1, feature_id) + _packed(2, tags) + _field_varint(3, 1) + _packed(4, geometry)
+        encoded.append(_field_bytes(2, feature))
+
+    layer = _field_varint(15, 2) + _field_bytes(1, name.encode('utf-8')) + b''.join(encoded)
+    layer += b''.join(_field_bytes(3, key.encode('utf-8')) for key in keys)
+    for value in values:
+        if isinstance(value, str):
+            layer += _field_bytes(4, _field_bytes(1, value.encode('utf-8')))
+        elif isinstance(value, int):
+            layer += _field_bytes(4, _field_varint(6, _zigzag(value)))
+        else:
+            layer += _field_bytes(4, _varint((3 << 3) | 1) + struct.pack('<d', float(value)))
+    layer += _field_varint(5, extent)
+    return _field_bytes(3, layer)
+
+# --- Tile geometry ---
+
+def tile_bounds(z, x, y):
+    """Returns (south, west, north, east) of a slippy-map tile."""
+    n = 2 ** z
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    south = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return south, west, north, east
+
+def _world_xy(lat, lng):
+    lat = max(-85.05112878, min(85.05112878, lat))
+    sin = math.sin(math.radians(lat))
+    return lng / 360.0 + 0.5, 0.5 - math.log((1 + sin) / (1 - sin)) / (4 * math.pi)
+
+def _version_dir(cursor):
+    """Disk directory of a catalog version: 'v27', or 'vmain=27,benguela=3' when sharded."""
+    return 'v' + str(cursor).replace(':', '=')
+
+def _version_order(name):
+    """Sum of the shard versions in a version directory name (it grows with every change); None for other names."""
+    if not name.startswith('v'):
+        return None
+    total = 0
+    for part in name[1:].split(','):
+        try:
+            total += int(part.rpartition('=')[2])
+        except ValueError:
+            return None
+    return total
+
+class TileCache:
+    """Encodes institution tiles on demand and caches them in memory (LRU) and on disk.
+
+    Disk tiles live in one directory per catalog version (the database's
+    change counter, see Institution.catalog_version), so every worker names
+    them alike and they survive restarts. A directory is never changed in
+    place: on a change each worker moves on to the new version's directory as
+    it learns of it, and removes the directories older than the one it left.
+    The LRU only drops the tiles around a changed institution (all of them on
+    a bulk change).
+    """
+
+    LAYER = "institutions"
+    EXTENT = 4096
+    BUFFER = 64  # tile units drawn past the edge so symbols are not clipped
+
+    def __init__(self, db, cache_dir="tile_cache", max_entries=2048, max_zoom=20):
+        self.db = db
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_zoom = max_zoom
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._version = None       # directory tiles are read from and written to; None after a change
+        self._last_version = None
+        self._generation = 0       # bumped on every change, so a tile rendered before one is not kept
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        catalog_cache.subscribe(self._on_catalog_change)
+
+    def _path(self, version, z, x, y):
+        return os.path.join(self.cache_dir, version, str(z), str(x), f"{y}.mvt")
+
+    def get(self, z, x, y):
+        """Returns (tile bytes, etag) for z/x/y."""
+        key = (z, x, y)
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry
+            generation, version = self._generation, self._version
+        if version is None:
+            version = self._load_version(generation)
+
+        path = self._path(version, z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            kind = "disk_hits"
+        except OSError:
+            data = self._render(z, x, y)
+            self._write_disk(path, data)
+            kind = "misses"
+
+        entry = (data, hashlib.sha1(data).hexdigest())
+        with self._lock:
+            self._stats[kind] += 1
+            if self._generation == generation:
+                self._lru[key] = entry
+                while len(self._lru) > self.max_entries:
+                    self._lru.popitem(last=False)
+        return entry
+
+    def _load_version(self, generation):
+        from src.models.institution import Institution
+
+        version = _version_dir(Institution(self.db).catalog_version())
+        with self._lock:
+            if self._generation == generation:
+                self._version = version
+            previous, self._last_version = self._last_version, version
+        if previous is not None and previous != version:
+            self._prune(_version_order(previous))
+        return version
+
+    def _prune(self, before):
+        """Removes the directories of versions older than `before` (workers have moved past them)."""
+        if not self.cache_dir or before is None:
+            return
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            order = _version_order(name)
+            if order is not None and order < before:
+                shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+
+    def _render(self, z, x, y):
+        from src.models.institution import Institution
+
+        south, west, north, east = tile_bounds(z, x, y)
+        # Widen the query by the buffer so neighbouring tiles agree at the edges
+        pad_lng = (east - west) * self.BUFFER / self.EXTENT
+        pad_lat = (north - south) * self.BUFFER / self.EXTENT
+        rows = Institution(self.db).find_in_bbox(
+            max(-90.0, south - pad_lat), max(-180.0, west - pad_lng),
+            min(90.0, north + pad_lat), min(180.0, east + pad_lng),
+        )
+
+        n = 2 ** z
+        features = []
+        for inst in rows:
+            wx, wy = _world_xy(inst["latitude"], inst["longitude"])
+            px = round((wx * n - x) * self.EXTENT)
+            py = round((wy * n - y) * self.EXTENT)
+            features.append((inst["id"], px, py, {"id": inst["id"], "name": inst["name"], "type": inst["type"]}))
+        return encode_point_layer(self.LAYER, features, self.EXTENT)
+
+    def _write_disk(self, path, data):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception("Error writing tile cache")
+
+    def _tiles_containing(self, lat, lng):
+        """Yields every z/x/y whose buffered area contains a point."""
+        wx, wy = _world_xy(lat, lng)
+        margin = self.BUFFER / self.EXTENT
+        for z in range(self.max_zoom + 1):
+            n = 2 ** z
+            fx, fy = wx * n, wy * n
+            xs = {int(fx + d) for d in (-margin, 0, margin) if 0 <= fx + d < n}
+            ys = {int(fy + d) for d in (-margin, 0, margin) if 0 <= fy + d < n}
+            for tx in xs:
+                for ty in ys:
+                    yield z, tx, ty
+
+    def _on_catalog_change(self, version, changed):
+        with self._lock:
+            self._generation += 1
+            self._version = None  # tiles on disk are read from the new version's directory
+            if changed is None:
+                self._lru.clear()
+                return
+            for inst in changed:
+                if inst.get("latitude") is None or inst.get("longitude") is None:
+                    continue
+                for key in self._tiles_containing(inst["latitude"], inst["longitude"]):
+                    if self._lru.pop(key, None) is not None:
+                        self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._lru)
+            stats["version"] = self._version
+        return stats
@@ -1,3 +1,5 @@
+from src.passwords import password_hasher
+
 class User:
     def __init__(self, db, id=None, email=None, username=None, password=None):
         self.db = db
@@ -8,7 +10,12 @@ class User:
 
     def create(self):
         """Creates a new user in the database."""
-        # Note: In production, hash password here.
+        # Stored as a salted scrypt hash, never in plaintext.
+        self.password = password_hasher.hash(self.password)
+        return self.insert()
+
+    def insert(self):
+        """Inserts the user; the password must already be hashed (see create)."""
         query = "INSERT INTO users (email, username, password) VALUES (?, ?, ?)"
         try:
             self.id = self.db.execute(query, (self.email, self.username, self.password))
@@ -30,5 +37,20 @@ class User:
         return None
 
     def verify_password(self, input_password):
-        """Verifies if the input password matches the stored password."""
-        return self.password == input_password
+        """Verifies the input password, upgrading legacy or outdated hashes on success."""
+        matches, new_hash = self.check_password(input_password)
+        if new_hash is not None:
+            self.save_password(new_hash)
+        return matches
+
+    def check_password(self, input_password):
+        """The hashing half of verify_password: (matches, upgraded hash or None). Writes nothing."""
+        matches, needs_rehash = password_hasher.verify(self.password, input_password)
+        if matches and needs_rehash:
+            return True, password_hasher.hash(input_password)
+        return matches, None
+
+    def save_password(self, password_hash):
+        """Stores an already hashed password."""
+        self.password = password_hash
+        self.db.execute("UPDATE users SET password = ? WHERE id = ?", (self.password, self.id))
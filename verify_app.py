@@ -9,14 +9,14 @@ def test_login():
     url = f"{BASE_URL}/api/login"
     
     # Test Invalid
-    resp = requests.post(url, json={"username": "admin", "password": "wrongpassword"})
+    resp = requests.post(url, json={"email": "admin@luanda.ao", "password": "wrongpassword"})
     if resp.status_code == 401:
         print("PASS: Invalid credentials rejected")
     else:
         print(f"FAIL: Invalid credentials not rejected (Status: {resp.status_code})")
 
     # Test Valid
-    resp = requests.post(url, json={"username": "admin", "password": "password123"})
+    resp = requests.post(url, json={"email": "admin@luanda.ao", "password": "Luanda2026"})
     if resp.status_code == 200 and resp.json().get("success"):
         print("PASS: Valid login successful")
         return resp.cookies
@@ -39,11 +39,33 @@ def test_institutions(cookies):
     else:
         print(f"FAIL: Failed to get institutions (Status: {resp.status_code})")
 
+def test_catalog_encodings(cookies):
+    print("Testing Catalog Encodings...")
+    url = f"{BASE_URL}/api/institutions"
+    bodies = {}
+    for encoding in ("identity", "gzip"):
+        resp = requests.get(url, cookies=cookies, headers={"Accept-Encoding": encoding})
+        if resp.status_code != 200:
+            print(f"FAIL: {encoding} catalog failed (Status: {resp.status_code})")
+            continue
+        bodies[encoding] = resp.json()
+        resp = requests.get(url, cookies=cookies, headers={"Accept-Encoding": encoding, "If-None-Match": resp.headers.get("ETag", "")})
+        if resp.status_code == 304:
+            print(f"PASS: {encoding} catalog revalidated")
+        else:
+            print(f"FAIL: {encoding} catalog not revalidated (Status: {resp.status_code})")
+
+    if len(bodies) == 2 and bodies["identity"] == bodies["gzip"]:
+        print("PASS: Plain and gzip catalogs match")
+    else:
+        print("FAIL: Plain and gzip catalogs differ")
+
 if __name__ == "__main__":
     time.sleep(2) # Give server time to start
     try:
         cookies = test_login()
         test_institutions(cookies)
+        test_catalog_encodings(cookies)
         print("\nAll tests passed!")
     except Exception as e:
         print(f"Tests failed with error: {e}")